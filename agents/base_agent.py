@@ -3,6 +3,7 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
 from typing import Any
+from scheduler import DEFAULT_TENANT, get_scheduler
 
 class BaseAgent(ABC):
     """
@@ -18,6 +19,30 @@ class BaseAgent(ABC):
         time = datetime.now().strftime("%H:%M:%S")
         print(f"[{time}] [{self.name}] {message}")
 
+    def report(self, current: int, total: int, message: str | None = None, **details):
+        """Reports progress within the running stage (see progress.ProgressTracker.step), if the job tracks it."""
+        tracker = getattr(self.sm, "progress", None)
+        if tracker is not None:
+            tracker.step(current, total, message, **details)
+
+    def scheduled(self, resource: str, cost: float = 1.0, units: int | None = None, interactive: bool = False):
+        """
+        Context manager holding one slot of the shared `resource` ("llm",
+        "media") for a single call, queued fairly under the job's tenant.
+        `units` is how many such calls the job needs in total.
+        """
+        return get_scheduler().slot(resource, tenant=self.sm.get("tenant") or DEFAULT_TENANT, cost=cost,
+                                    units=units, interactive=interactive or bool(self.sm.get("interactive")))
+
+    def record_failure(self, message: str):
+        """
+        Notes a recoverable failure (a chunk the LLM could not process, an
+        image that could not be fetched). The job still finishes, but its
+        result is degraded, so it is neither checkpointed nor cached.
+        """
+        self.log(f"WARNING: {message}")
+        self.sm.modify("failures", lambda failures: (failures or []) + [f"{self.name}: {message}"])
+
     def update_state(self, key: str, value: Any):
         """Update a value in the shared state."""
         self.sm.update(key, value)
@@ -2,11 +2,13 @@
 # ContentAgent updated to handle large PDFs using chunking.
 
 from .base_agent import BaseAgent
+from models import Chapter, Topic
 import fitz
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import json
+import bisect
 
 # --- NEW: Function to split text into chunks ---
 def chunk_text(text: str, chunk_size: int = 10000, overlap: int = 500) -> list[str]:
@@ -39,6 +41,7 @@ class ContentAgent(BaseAgent):
         # Define chunk size here (can be adjusted)
         self.chunk_size = 12000 # Max characters per chunk
         self.overlap = 500     # Overlap to maintain context between chunks
+        self.page_starts = []
 
     def _extract_text_from_pdf(self, pdf_path: str) -> str:
         # ... (This function remains unchanged)
@@ -48,7 +51,10 @@ class ContentAgent(BaseAgent):
         try:
             doc = fitz.open(pdf_path)
             text = ""
+            # Character offset where each page starts, for slide -> page provenance
+            self.page_starts = []
             for page in doc:
+                self.page_starts.append(len(text))
                 text += page.get_text()
             doc.close()
             self.log(f"Extracted {len(text)} characters from {pdf_path}")
@@ -57,6 +63,21 @@ class ContentAgent(BaseAgent):
             self.log(f"ERROR: Failed to extract text from PDF. Details: {e}")
             return ""
 
+    def _page_range(self, start: int, end: int) -> list[int]:
+        """1-based [first, last] pages covered by the character range [start, end)."""
+        first = bisect.bisect_right(self.page_starts, start)
+        last = bisect.bisect_right(self.page_starts, max(start, end - 1))
+        return [max(first, 1), max(last, 1)]
+
+    def _extract_pages(self, pdf_path: str, first: int, last: int) -> str:
+        """Text of the 1-based, inclusive page range [first, last]."""
+        try:
+            with fitz.open(pdf_path) as doc:
+                return "".join(doc[i].get_text() for i in range(first - 1, min(last, len(doc))))
+        except Exception as e:
+            self.log(f"ERROR: Failed to extract pages {first}-{last} from PDF. Details: {e}")
+            return ""
+
     # --- UPDATED: No more slicing needed here ---
     def _get_structured_content_from_llm(self, text_chunk: str, tone: str, slide_count: int) -> dict:
         """Sends a text chunk to the Gemini API."""
@@ -84,6 +105,11 @@ class ContentAgent(BaseAgent):
         """
         # Note: slide_count is less directly applicable per chunk, but kept for context.
 
+        return self._generate_json(model, prompt)
+
+    def _generate_json(self, model, prompt: str) -> dict:
+        """Runs a prompt and parses the JSON object the model returns ({} on failure)."""
+        response_text = ""
         try:
             response = model.generate_content(prompt)
             # Add more robust error handling for potentially empty/invalid responses
@@ -95,6 +121,10 @@ class ContentAgent(BaseAgent):
                  self.log("WARNING: Gemini API returned empty text after stripping.")
                  return {}
             structured_data = json.loads(response_text)
+            if not isinstance(structured_data, dict):
+                self.log(f"ERROR: Expected a JSON object from Gemini API for chunk, got {type(structured_data).__name__}.")
+                self.log(f"Raw response text: {response_text[:500]}...")
+                return {}
             self.log("Successfully received and parsed structured content for chunk.")
             return structured_data
         except json.JSONDecodeError as e:
@@ -105,6 +135,59 @@ class ContentAgent(BaseAgent):
             self.log(f"ERROR: Failed to get structured content from Gemini API for chunk. Details: {e}")
             return {}
 
+    def _get_topic_from_llm(self, source_text: str, topic_title: str, tone: str) -> dict:
+        """Re-generates a single topic from the slice of source text it came from."""
+        if not source_text: return {}
+
+        self.log(f"Re-generating topic '{topic_title}' from {len(source_text)} characters of source text...")
+
+        model = genai.GenerativeModel('models/gemini-2.5-pro')
+
+        prompt = f"""
+        You are an expert educational content designer. The following text is the part of a syllabus that covers the topic "{topic_title}". Rewrite that single topic for a presentation slide. Your output must be ONLY a well-formed JSON object.
+
+        Specifications:
+        1.  **Audience Tone**: Tailor for a '{tone}' audience.
+        2.  **Output Format**: ONLY a well-formed JSON object for one topic with the keys "title", "summary", "key_points", "quiz_questions", "image_hint".
+        3.  **Diagrams**: If the topic describes a clear process/flow (e.g., A -> B -> C), include a "diagram_dot_code" field with simple Graphviz DOT code (e.g., 'digraph {{ A -> B -> C; }}'). Omit otherwise.
+
+        Here is the source text:
+        ---
+        {source_text}
+        ---
+        """
+        return self._generate_json(model, prompt)
+
+    def regenerate_topic(self, chapter_index: int, topic_index: int) -> Topic | None:
+        """
+        Re-prompts the LLM for one topic using only the pages its chapter was
+        extracted from, and replaces that topic in the state's chapters.
+        """
+        chapters = self.sm.get("chapters") or []
+        chapter = chapters[chapter_index]
+        topic = chapter.topics[topic_index]
+        first, last = chapter.source.get("pages", [1, 1])
+        source_text = self._extract_pages(self.sm.get("input_pdf_path"), first, last)
+
+        # A single topic for someone editing the deck: served ahead of batch work
+        with self.scheduled("llm", cost=len(source_text), units=1, interactive=True):
+            new_topic = self._get_topic_from_llm(source_text, topic.title, self.sm.get("tone") or "Beginner")
+        if not new_topic:
+            self.log(f"ERROR: Could not regenerate topic '{topic.title}'.")
+            return None
+        try:
+            new_topic = Topic.from_dict({**new_topic, "id": topic.id})
+        except ValueError as e:
+            self.log(f"ERROR: Malformed topic returned for '{topic.title}'. Details: {e}")
+            return None
+
+        topics = list(chapter.topics)
+        topics[topic_index] = new_topic
+        chapters = list(chapters)
+        chapters[chapter_index] = chapter.replace(topics=topics)
+        self.update_state("chapters", chapters)
+        return new_topic
+
     # --- UPDATED: Main run method now handles chunking ---
     def run(self):
         self.log("Starting real content extraction with chunking...")
@@ -128,15 +211,26 @@ class ContentAgent(BaseAgent):
         # Process each chunk individually
         for i, chunk in enumerate(text_chunks):
             self.log(f"Processing chunk {i+1}/{len(text_chunks)}...")
-            structured_content = self._get_structured_content_from_llm(chunk, tone, slide_count)
+            # One LLM slot per chunk, so other jobs can get in between this job's chunks
+            with self.scheduled("llm", cost=len(chunk), units=len(text_chunks)):
+                structured_content = self._get_structured_content_from_llm(chunk, tone, slide_count)
             
             # Append chapters found in this chunk's result
-            if structured_content and "chapters" in structured_content:
+            if structured_content and isinstance(structured_content.get("chapters"), list):
+                # Record where these chapters came from, so single slides can be regenerated later
+                chunk_start = i * (self.chunk_size - self.overlap)
+                source = {"chunk_index": i, "pages": self._page_range(chunk_start, chunk_start + len(chunk))}
+                # The LLM's JSON is validated here, once; later agents work on the typed records.
                 # Basic merging: just add all chapters from all chunks.
                 # More advanced merging could try to combine topics under existing chapter titles.
-                all_chapters.extend(structured_content["chapters"])
+                for chapter in structured_content["chapters"]:
+                    try:
+                        all_chapters.append(Chapter.from_dict(chapter, f"ch{len(all_chapters) + 1}", source))
+                    except ValueError as e:
+                        self.log(f"WARNING: Skipping malformed chapter in chunk {i+1}. Details: {e}")
             else:
-                self.log(f"No valid 'chapters' structure returned for chunk {i+1}.")
+                self.record_failure(f"No valid 'chapters' structure returned for chunk {i+1}.")
+            self.report(i + 1, len(text_chunks), f"Analyzed chunk {i+1}/{len(text_chunks)}", unit="chunk")
 
         # Update the state with the combined chapters from all chunks
         if all_chapters:
@@ -144,7 +238,7 @@ class ContentAgent(BaseAgent):
             # For now, just combine them all.
             self.update_state("chapters", all_chapters)
             self.log(f"Content processed from all chunks. Found {len(all_chapters)} chapters in total.")
-            self.sm.save("shared_state_after_content.json")
+            self.sm.snapshot("shared_state_after_content")
         else:
             self.log("ERROR: No chapters were successfully processed from any chunk.")
 
@@ -34,7 +34,7 @@ class DesignAgent(BaseAgent):
 
         self.update_state("design", design_config)
         self.log(f"Design theme set to '{design_config['theme_name']}'.")
-        self.sm.save("shared_state_after_design.json")
+        self.sm.snapshot("shared_state_after_design")
 
 
 
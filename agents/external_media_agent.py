@@ -2,6 +2,7 @@
 # Final MediaAgent: Generates diagrams with Graphviz or fetches photos from Pexels.
 
 from .base_agent import BaseAgent
+from models import Slide
 from dotenv import load_dotenv
 import os
 import requests
@@ -20,8 +21,9 @@ class ExternalMediaAgent(BaseAgent):
         self.pexels_api_key = os.getenv("PEXELS_API_KEY")
         if not self.pexels_api_key:
             self.log("WARNING: PEXELS_API_KEY not found. Stock photo search will be disabled.")
-        self.assets_dir = "assets"
-        os.makedirs(self.assets_dir, exist_ok=True)
+        # Assets live in the job's own workspace so concurrent jobs never collide
+        self.assets_dir = self.sm.workspace.assets_dir
+        self.bytes_downloaded = 0
 
     def _generate_diagram_from_dot(self, dot_code: str, slide_id: str) -> str | None:
         """Renders Graphviz DOT code into a PNG image."""
@@ -57,34 +59,54 @@ class ExternalMediaAgent(BaseAgent):
                 # Use slide_id + extension for unique filenames
                 file_path = os.path.join(self.assets_dir, f"{slide_id}.{file_extension}")
                 with open(file_path, 'wb') as f: f.write(image_response.content)
+                self.bytes_downloaded += len(image_response.content)
                 self.log(f"Image downloaded successfully to {file_path}")
                 return file_path
         except requests.exceptions.RequestException as e:
-            self.log(f"ERROR: Pexels API request failed. Details: {e}")
+            self.record_failure(f"Pexels API request failed for slide {slide_id}. Details: {e}")
         return None
 
+    def attach_visual(self, slide: Slide, units: int | None = None) -> Slide:
+        """
+        Generates or fetches the visual for one content slide. Returns a copy
+        with its image_path set. `units` is the number of slides the job is
+        fetching visuals for; None means a single slide someone is waiting on.
+        """
+        image_path = None
+        
+        if slide.diagram_dot_code:
+            # Attempt to generate diagram first
+            image_path = self._generate_diagram_from_dot(slide.diagram_dot_code, slide.id)
+        
+        # If no diagram was generated OR no code was provided, fall back to Pexels
+        if not image_path and slide.image_hint:
+            self.log(f"No diagram generated/found for slide {slide.id}. Searching Pexels...")
+            with self.scheduled("media", units=units or 1, interactive=units is None):
+                image_path = self._fetch_image_from_pexels(slide.image_hint, slide.id)
+
+        if image_path:
+            return slide.replace(image_path=image_path)
+        return slide
+
     def run(self):
         self.log("Starting visual asset generation...")
         slides = self.sm.get("slides")
         if not slides: return
 
+        # The plan in the state is read-only; build a new list with the visuals attached
+        total = sum(1 for slide in slides if slide.type == "content")
+        done = 0
+        with_visuals = []
         for slide in slides:
-            if slide.get("type") == "content":
-                image_path = None
-                dot_code = slide.get("diagram_dot_code")
-                
-                if dot_code:
-                    # Attempt to generate diagram first
-                    image_path = self._generate_diagram_from_dot(dot_code, slide["id"])
-                
-                # If no diagram was generated OR no code was provided, fall back to Pexels
-                if not image_path and slide.get("image_hint"):
-                    self.log(f"No diagram generated/found for slide {slide['id']}. Searching Pexels...")
-                    image_path = self._fetch_image_from_pexels(slide["image_hint"], slide["id"])
+            if slide.type == "content":
+                downloaded = self.bytes_downloaded
+                slide = self.attach_visual(slide, units=total)
+                done += 1
+                self.report(done, total, f"Visuals for slide {done}/{total}", unit="slide",
+                            bytes=self.bytes_downloaded - downloaded)
+            with_visuals.append(slide)
+        slides = with_visuals
 
-                if image_path:
-                    slide["image_path"] = image_path
-            
         self.update_state("slides", slides)
         # We don't strictly need this save anymore unless debugging
         # self.sm.save("shared_state_after_media.json")
\ No newline at end of file
@@ -54,13 +54,110 @@
 # FormatAgent → reads rich content and produces a detailed slide skeleton.
 
 from .base_agent import BaseAgent
+from models import Chapter, Slide, Topic
+from itertools import zip_longest
 
 class FormatAgent(BaseAgent):
     """
     Converts the rich chapter/topic structure from the ContentAgent
     into a detailed slide-by-slide plan.
+
+    The plan is held to the user's `slide_count`, counting every slide
+    (bookends, chapter titles and quizzes included): topics are ranked and
+    only the best ones that fit get a content slide, so the media and
+    presentation stages do work proportional to the slides asked for.
     """
 
+    def __init__(self, name, state_manager, config=None):
+        super().__init__(name, state_manager)
+        self.config = config or {}
+        # Quiz questions kept per chapter (config 'quiz_questions_per_chapter')
+        self.quiz_limit = self.config.get("quiz_questions_per_chapter", 3)
+
+    @staticmethod
+    def content_slide(slide_id: str, topic: Topic) -> Slide:
+        """The slide record for one topic."""
+        # The hint and DOT code are passed along for the media agent
+        return Slide(slide_id, "content", topic.title, bullets=topic.key_points,
+                     image_hint=topic.image_hint, diagram_dot_code=topic.diagram_dot_code)
+
+    @staticmethod
+    def _provenance(chapter_index: int, chapter: Chapter, topic_index: int | None = None) -> dict:
+        """Where a slide's content came from: chapter/topic, source chunk and PDF pages."""
+        source = chapter.source
+        record = {
+            "chapter_index": chapter_index, "chapter_id": chapter.id,
+            "chunk_index": source.get("chunk_index"), "pages": source.get("pages")
+        }
+        if topic_index is not None:
+            record["topic_index"] = topic_index
+            record["topic_id"] = chapter.topics[topic_index].id
+        return record
+
+    @staticmethod
+    def _topic_score(chapter: Chapter, topic: Topic) -> float:
+        """
+        How much a topic deserves a slide: how much it says (key points,
+        summary, a diagram) plus how many source pages its chapter covers per topic.
+        """
+        first, last = chapter.source.get("pages") or [1, 1]
+        coverage = (last - first + 1) / max(len(chapter.topics), 1)
+        return (len(topic.key_points) + min(len(topic.summary) / 200, 2)
+                + (1 if topic.diagram_dot_code else 0) + min(coverage, 3))
+
+    def select_topics(self, chapters: list[Chapter], budget: int | None) -> dict[int, list[int]]:
+        """
+        Chapter index -> indices of the topics that get a slide, in document
+        order, so that the whole deck is at most `budget` slides (no limit if
+        falsy). Topics are taken best first; one that would open a new
+        chapter also pays for its title slide (and quiz slide), so a tight
+        budget goes to fewer, fuller chapters. At least one topic is always
+        kept. Topics repeated by overlapping chunks are kept once.
+        """
+        best = {}
+        for ci, chapter in enumerate(chapters):
+            for ti, topic in enumerate(chapter.topics):
+                key = topic.title.casefold()
+                score = self._topic_score(chapter, topic)
+                if key not in best or score > best[key][0]:
+                    best[key] = (score, ci, ti)
+        # Highest score first; ties keep document order
+        ranked = sorted(best.values(), key=lambda c: (-c[0], c[1], c[2]))
+
+        # The main title and thank-you slides are always there
+        remaining = budget - 2 if budget else None
+        chosen, opened, quizzed = [], set(), set()
+        for candidate in ranked:
+            _, ci, ti = candidate
+            has_quiz = self.quiz_limit > 0 and any(chapters[ci].topics[ti].quiz_questions)
+            cost = 1 + (ci not in opened) + (has_quiz and ci not in quizzed)
+            if remaining is not None and cost > remaining and chosen:
+                continue
+            chosen.append(candidate)
+            opened.add(ci)
+            if has_quiz:
+                quizzed.add(ci)
+            if remaining is not None:
+                remaining -= cost
+
+        selected = {}
+        for _, ci, ti in sorted(chosen, key=lambda c: (c[1], c[2])):
+            selected.setdefault(ci, []).append(ti)
+        return selected
+
+    @staticmethod
+    def _sample_quiz(topics: list[Topic], limit: int) -> list[str]:
+        """Up to `limit` distinct questions, taken round-robin so each topic is represented."""
+        questions, seen = [], set()
+        for round_ in zip_longest(*(topic.quiz_questions for topic in topics)):
+            for question in round_:
+                if question and question.casefold() not in seen:
+                    seen.add(question.casefold())
+                    questions.append(question)
+                    if len(questions) >= limit:
+                        return questions
+        return questions
+
     def run(self):
         self.log("Starting slide skeleton creation...")
 
@@ -69,62 +166,53 @@ class FormatAgent(BaseAgent):
             self.log("ERROR: No chapters found in state. Aborting.")
             return
 
+        budget = self.sm.get("slide_count")
+        selected = self.select_topics(chapters, budget)
+        self.log(f"Selected {sum(map(len, selected.values()))} of "
+                 f"{sum(len(ch.topics) for ch in chapters)} topics (slide budget: {budget or 'none'}).")
+
         slides = []
+        # slide id -> where its content came from (chapter/topic, chunk, PDF pages)
+        provenance = {}
         slide_counter = 1
 
         # Add a main title slide for the entire presentation
-        slides.append({
-            "id": f"slide_{slide_counter}",
-            "type": "main_title",
-            "title": "Educational Presentation on Machine Learning",
-            "subtitle": "Auto-Generated by the Multi-Agent System"
-        })
+        slides.append(Slide(f"slide_{slide_counter}", "main_title",
+                            "Educational Presentation on Machine Learning",
+                            "Auto-Generated by the Multi-Agent System"))
         slide_counter += 1
 
-        for ch in chapters:
+        for chapter_index, ch in enumerate(chapters):
+            topic_indices = selected.get(chapter_index)
+            if not topic_indices:
+                # Chapters without a selected topic are left out entirely
+                continue
+
             # Chapter title slide
-            slides.append({
-                "id": f"slide_{slide_counter}",
-                "type": "chapter_title",
-                "title": ch.get("title", "Untitled Chapter"),
-                "subtitle": ch.get("description", "")
-            })
+            provenance[f"slide_{slide_counter}"] = self._provenance(chapter_index, ch)
+            slides.append(Slide(f"slide_{slide_counter}", "chapter_title", ch.title, ch.description))
             slide_counter += 1
 
-            for topic in ch.get("topics", []):
+            for topic_index in topic_indices:
                 # Topic content slide
-                slides.append({
-                    "id": f"slide_{slide_counter}",
-                    "type": "content",
-                    "title": topic.get("title", "Untitled Topic"),
-                    "bullets": topic.get("key_points", []),
-                    "image_hint": topic.get("image_hint", None) # Pass along the hint
-                })
+                slides.append(self.content_slide(f"slide_{slide_counter}", ch.topics[topic_index]))
+                provenance[f"slide_{slide_counter}"] = self._provenance(chapter_index, ch, topic_index)
                 slide_counter += 1
 
-            # Quiz slide for the chapter
-            quiz_questions = []
-            for topic in ch.get("topics", []):
-                quiz_questions.extend(topic.get("quiz_questions", []))
-            
+            # Quiz slide for the chapter, sampled from its selected topics
+            quiz_questions = self._sample_quiz([ch.topics[i] for i in topic_indices], self.quiz_limit)
+
             if quiz_questions:
-                slides.append({
-                    "id": f"slide_{slide_counter}",
-                    "type": "quiz",
-                    "title": f"Chapter {ch['id'][-1]} Quiz",
-                    "bullets": quiz_questions
-                })
+                provenance[f"slide_{slide_counter}"] = self._provenance(chapter_index, ch)
+                slides.append(Slide(f"slide_{slide_counter}", "quiz", f"Chapter {ch.id[-1]} Quiz",
+                                    bullets=quiz_questions))
                 slide_counter += 1
 
         # Add a final "Thank You" slide
-        slides.append({
-            "id": f"slide_{slide_counter}",
-            "type": "thank_you",
-            "title": "Thank You!",
-            "subtitle": "Any Questions?"
-        })
+        slides.append(Slide(f"slide_{slide_counter}", "thank_you", "Thank You!", "Any Questions?"))
 
         self.update_state("slides", slides)
+        self.update_state("provenance", provenance)
         self.log(f"Slide skeleton created with {len(slides)} slides.")
-        # Optional: Save a snapshot for debugging
-        self.sm.save("shared_state_after_format.json")
\ No newline at end of file
+        # Debug snapshot; a no-op unless snapshots are enabled for the job
+        self.sm.snapshot("shared_state_after_format")
\ No newline at end of file
@@ -2,28 +2,251 @@
 # Final version: Handles complex quiz data and generates the complete presentation.
 
 from .base_agent import BaseAgent
-from pptx import Presentation
+from models import Slide
+from image_optimizer import ImageOptimizer
+from template_cache import get_template_cache
+from layout_index import slide_kind
+from pptx_package import PptxAssembler, merge_packages, replace_slide
 from pptx.util import Inches
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from io import BytesIO
 import os
 
+
+def _build_shard(template_path, slides_plan, config) -> bytes:
+    """Process-pool entry point: builds one shard of a sharded deck."""
+    return PresentationAgent("PresentationAgent[shard]", None, config).build(template_path, slides_plan)
+
+
 class PresentationAgent(BaseAgent):
     """
     Generates the final .pptx presentation, handling all slide types, layouts,
     images, and cleaning up the presentation before saving.
     """
 
-    def _delete_initial_slide(self, prs, slides_plan):
-        while len(prs.slides) > len(slides_plan):
-            xml_slides = prs.slides._sldIdLst  
-            to_remove = xml_slides[0]
-            xml_slides.remove(to_remove)
-            self.log("Removed an initial blank slide.")
+    def __init__(self, name, state_manager, config=None):
+        super().__init__(name, state_manager)
+        self.config = config or {}
+        # Images are resized to their placeholder at this DPI before embedding
+        self.image_optimizer = None
+        if self.config.get("optimize_images", True):
+            self.image_optimizer = ImageOptimizer(dpi=self.config.get("image_dpi", 150))
+
+    def _load_template(self, template_path):
+        """Returns (template_path, prs, layouts), falling back to the default template on failure."""
+        # Templates come from the process-wide cache already stripped of their
+        # starter slides, together with their precomputed layout index.
+        template_cache = get_template_cache()
+        try:
+            prs = template_cache.load(template_path)
+            layouts = template_cache.layout_index(template_path)
+        except Exception as e:
+            self.log(f"ERROR: Failed to load template '{template_path}'. Creating blank presentation. Details: {e}")
+            template_path = None
+            prs = template_cache.load()
+            layouts = template_cache.layout_index()
+        return template_path, prs, layouts
+
+    @staticmethod
+    def _fill_bullets(tf, bullets):
+        tf.clear()
+        # clear() leaves one empty paragraph; the first bullet goes there so
+        # the frame holds exactly what paginate() measured
+        for i, bullet in enumerate(bullets):
+            p = tf.paragraphs[0] if i == 0 else tf.add_paragraph()
+            p.text = bullet
+            p.level = 0
+
+    def _add_slide(self, prs, layouts, slide_data: Slide):
+        """Adds one slide from the plan to `prs`, using the template's layout index."""
+        image_path = slide_data.image_path
+        has_image = bool(image_path and os.path.exists(image_path))
+        kind = slide_kind(slide_data.type, has_image)
+        spec = layouts[kind]
+        if kind == "content_with_image" and spec.image_box is None:
+            # The template has no layout with room for a picture; the slide goes out without it
+            self.log(f"WARNING: No picture layout in the template; slide '{slide_data.id}' is built without its image.")
+            kind = "content"
+        slide = prs.slides.add_slide(prs.slide_layouts[spec.layout_position])
+
+        if spec.title_idx is not None:
+            slide.placeholders[spec.title_idx].text = slide_data.title
+
+        if kind == "title":
+            if spec.subtitle_idx is not None:
+                slide.placeholders[spec.subtitle_idx].text = slide_data.subtitle
+        
+        elif kind == "content":
+            if spec.body_idx is not None:
+                self._fill_bullets(slide.placeholders[spec.body_idx].text_frame, slide_data.bullets)
+        
+        elif kind == "content_with_image":
+            if spec.body_idx is not None:
+                self._fill_bullets(slide.placeholders[spec.body_idx].text_frame, slide_data.bullets)
+
+            left, top, width, height = spec.image_box
+            if self.image_optimizer:
+                try:
+                    image_path = self.image_optimizer.optimize(image_path, width, height)
+                except Exception as e:
+                    self.log(f"WARNING: Could not optimize image {image_path}. Embedding original. Details: {e}")
+            slide.shapes.add_picture(image_path, left, top, width=width, height=height)
+            self.log(f"Added image {image_path} to slide.")
+        return slide
+
+    def _paginate_slide(self, layouts, fitter, slide_data: Slide) -> list:
+        """Splits one plan entry into itself plus '(cont.)' pages if its bullets overflow."""
+        bullets = slide_data.bullets
+        image_path = slide_data.image_path
+        kind = slide_kind(slide_data.type, bool(image_path and os.path.exists(image_path)))
+        if kind not in ("content", "content_with_image") or len(bullets) < 2:
+            return [slide_data]
+        first, rest = layouts[kind], layouts["content"]
+        if first.body_style is None or rest.body_style is None:
+            return [slide_data]
+
+        groups = fitter.split(bullets, (first.body_box, first.body_style), (rest.body_box, rest.body_style))
+        if len(groups) == 1:
+            return [slide_data]
+        pages = [slide_data.replace(bullets=[bullets[i] for i in groups[0]])]
+        for n, group in enumerate(groups[1:], start=1):
+            # The image stays on the first page only
+            pages.append(slide_data.replace(id=f"{slide_data.id}_cont{n}", title=f"{slide_data.title} (cont.)",
+                                            bullets=[bullets[i] for i in group], image_path=None))
+        self.log(f"Slide '{slide_data.id}' overflows; split into {len(pages)} slides.")
+        return pages
+
+    def paginate(self, template_path, slides_plan) -> list:
+        """
+        Measures every content slide's bullets against its body placeholder
+        using the theme font's glyph widths, and splits overflowing slides into
+        continuation slides. Purely local: nothing is rendered.
+        """
+        template_cache = get_template_cache()
+        try:
+            layouts = template_cache.layout_index(template_path)
+            fitter = template_cache.text_fitter(template_path)
+        except Exception as e:
+            self.log(f"WARNING: Could not measure text for '{template_path}'. Skipping pagination. Details: {e}")
+            return slides_plan
+        pages = []
+        for slide_data in slides_plan:
+            pages.extend(self._paginate_slide(layouts, fitter, slide_data))
+        return pages
+
+    def build(self, template_path, slides_plan) -> bytes:
+        """Builds a deck for `slides_plan` on a single core and returns it as .pptx bytes."""
+        template_path, prs, layouts = self._load_template(template_path)
+        for i, slide_data in enumerate(slides_plan, start=1):
+            self._add_slide(prs, layouts, slide_data)
+            self.report(i, len(slides_plan), f"Built slide {i}/{len(slides_plan)}", unit="slide")
+        buffer = BytesIO()
+        prs.save(buffer)
+        return buffer.getvalue()
+
+    def build_sharded(self, template_path, slides_plan, workers: int) -> bytes:
+        """
+        Splits the plan into contiguous shards, builds each shard as a partial
+        deck in a process pool, and merges the parts at the zip level
+        (identical images are stored once). The workers are spawned, not
+        forked: the caller is usually a threaded job worker.
+        """
+        template_path, _, _ = self._load_template(template_path)
+        shard_size = -(-len(slides_plan) // workers)
+        shards = [slides_plan[i:i + shard_size] for i in range(0, len(slides_plan), shard_size)]
+        self.log(f"Building {len(slides_plan)} slides in {len(shards)} shards...")
+        parts = []
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=get_context("spawn")) as pool:
+            for part in pool.map(_build_shard, [template_path] * len(shards), shards, [self.config] * len(shards)):
+                parts.append(part)
+                built = min(len(parts) * shard_size, len(slides_plan))
+                self.report(built, len(slides_plan), f"Built slide {built}/{len(slides_plan)}", unit="slide")
+        return merge_packages(get_template_cache().blob(template_path), parts)
+
+    @staticmethod
+    def _slide_payload(slide):
+        """(slide_xml, relationships, read_target) for a built slide, as PptxAssembler/replace_slide expect."""
+        part = slide.part
+        targets = {rel.target_ref: rel.target_part for rel in part.rels.values() if not rel.is_external}
+        relationships = [(rId, rel.reltype, rel.target_ref, rel.is_external) for rId, rel in part.rels.items()]
+        return part.blob, relationships, lambda target: targets[target].blob
+
+    def build_streaming(self, template_path, slides_plan, output):
+        """
+        Bounded-memory build: each finished slide part (and its images) is
+        written straight into the output zip and then dropped from the
+        in-memory presentation, so peak memory does not grow with slide count.
+        `output` is a file path or a writable binary stream.
+        """
+        template_path, prs, layouts = self._load_template(template_path)
+        assembler = PptxAssembler(get_template_cache().blob(template_path), output)
+        sld_id_lst = prs.slides._sldIdLst
+        for i, slide_data in enumerate(slides_plan, start=1):
+            assembler.add_slide(*self._slide_payload(self._add_slide(prs, layouts, slide_data)))
+            self.report(i, len(slides_plan), f"Built slide {i}/{len(slides_plan)}", unit="slide")
+            # Unlink the slide; its part and any images only it used become garbage
+            sld_id = sld_id_lst[-1]
+            prs.part.drop_rel(sld_id.rId)
+            sld_id_lst.remove(sld_id)
+        assembler.close()
+
+    def patch_slide(self, slide_data: Slide) -> bool:
+        """
+        Incremental edit: rebuilds only the slide whose id matches
+        `slide_data.id` (plus its continuation slides) and swaps its XML
+        (and images) into the previously built deck, leaving every other part
+        untouched. Updates the slide plan, the in-memory deck and, if it was
+        saved, the file on disk. If the edit changes how many continuation
+        slides are needed, the whole deck is rebuilt instead.
+        """
+        slide_id = slide_data.id
+        deck_order = self.sm.get("deck_order") or []
+        if slide_id not in deck_order:
+            self.log(f"ERROR: Slide '{slide_id}' is not part of the built deck.")
+            return False
+        output_path = self.sm.get("output_path")
+        pptx_bytes = self.sm.get_artifact("pptx")
+        if pptx_bytes is None and output_path and os.path.exists(output_path):
+            with open(output_path, "rb") as f:
+                pptx_bytes = f.read()
+        if pptx_bytes is None:
+            self.log("ERROR: No previously built presentation to patch.")
+            return False
+
+        slides = [slide_data if s.id == slide_id else s for s in self.sm.get("slides") or []]
+        self.update_state("slides", slides)
+
+        template_path = (self.sm.get("design") or {}).get("template_path")
+        if not (template_path and os.path.exists(template_path)):
+            template_path = None
+        template_path, prs, layouts = self._load_template(template_path)
+        pages = [slide_data]
+        if self.config.get("fit_text", True):
+            pages = self.paginate(template_path, pages)
+        positions = [i for i, page_id in enumerate(deck_order)
+                     if page_id == slide_id or str(page_id).startswith(f"{slide_id}_cont")]
+        if len(positions) != len(pages):
+            self.log(f"Slide '{slide_id}' now needs {len(pages)} slides instead of {len(positions)}; rebuilding the deck.")
+            self.run()
+            return True
+
+        for position, page in zip(positions, pages):
+            slide = self._add_slide(prs, layouts, page)
+            pptx_bytes = replace_slide(pptx_bytes, position, *self._slide_payload(slide))
+
+        self.sm.set_artifact("pptx", pptx_bytes)
+        if output_path:
+            with open(output_path, "wb") as f:
+                f.write(pptx_bytes)
+        self.log(f"Patched slide '{slide_id}' in place.")
+        return True
 
     def run(self):
         self.log("Starting final presentation generation...")
         slides_plan = self.sm.get("slides") or []
         design_config = self.sm.get("design")
-        output_dir = "output"
+        output_dir = self.sm.workspace.output_dir
         output_filename = "final_presentation.pptx"
         output_path = os.path.join(output_dir, output_filename)
 
@@ -32,82 +255,51 @@ class PresentationAgent(BaseAgent):
             return
 
         template_path = design_config.get("template_path")
-        try:
-            prs = Presentation(template_path) if template_path and os.path.exists(template_path) else Presentation()
-            self.log(f"Using template from: {template_path}" if template_path and os.path.exists(template_path) else "No valid template found. Creating default presentation.")
-        except Exception as e:
-            self.log(f"ERROR: Failed to load template '{template_path}'. Creating blank presentation. Details: {e}")
-            prs = Presentation()
-
-        layout_map = { "main_title": 0, "chapter_title": 0, "content_only": 1, "content_with_image": 8, "quiz": 1, "thank_you": 5 }
+        if not (template_path and os.path.exists(template_path)):
+            self.log("No valid template found. Creating default presentation.")
+            template_path = None
+        else:
+            self.log(f"Using template from: {template_path}")
+
+        # Overflowing bullet lists become continuation slides (config 'fit_text')
+        if self.config.get("fit_text", True):
+            slides_plan = self.paginate(template_path, slides_plan)
+
+        # Slide ids in deck order, so later edits can patch a single slide
+        self.update_state("deck_order", [s.id for s in slides_plan])
+
+        # config 'writer': "streaming" writes slide by slide with flat memory use
+        if self.config.get("writer") == "streaming":
+            if self.config.get("save_to_disk", True):
+                self.build_streaming(template_path, slides_plan, output_path)
+                self.update_state("output_path", output_path)
+                self.log(f"Presentation streamed successfully to: {output_path}")
+            else:
+                buffer = BytesIO()
+                self.build_streaming(template_path, slides_plan, buffer)
+                self.sm.set_artifact("pptx", buffer.getvalue())
+                self.log(f"Presentation streamed in memory ({buffer.tell()} bytes).")
+            return
 
-        for slide_data in slides_plan:
-            slide_type = slide_data.get("type", "content")
-            
-            image_path = slide_data.get("image_path")
-            layout_key = "content_only"
-            if slide_type == "content" and image_path and os.path.exists(image_path):
-                layout_key = "content_with_image"
-            elif slide_type != "content":
-                layout_key = slide_type
-
-            layout_index = layout_map.get(layout_key, 1)
-            
-            try:
-                slide_layout = prs.slide_layouts[layout_index]
-                slide = prs.slides.add_slide(slide_layout)
-            except IndexError:
-                self.log(f"WARNING: Layout index {layout_index} not found. Using default layout 1.")
-                slide_layout = prs.slide_layouts[1]
-                slide = prs.slides.add_slide(slide_layout)
-
-            if hasattr(slide.shapes, 'title') and slide.shapes.title is not None:
-                slide.shapes.title.text = slide_data.get("title", "")
-
-            if layout_key in ["main_title", "chapter_title"]:
-                if len(slide.placeholders) > 1:
-                    slide.placeholders[1].text = slide_data.get("subtitle", "")
-            
-            elif layout_key in ["content_only", "quiz"]:
-                if len(slide.placeholders) > 1:
-                    body_shape = slide.placeholders[1]
-                    tf = body_shape.text_frame
-                    tf.clear()
-                    for bullet in slide_data.get("bullets", []):
-                        p = tf.add_paragraph()
-                        # --- THIS IS THE FIX ---
-                        # Check if the bullet is a dictionary (for quizzes) or a simple string
-                        if isinstance(bullet, dict):
-                            p.text = bullet.get('question', '') # Use only the question text
-                        else:
-                            p.text = str(bullet) # Handle simple string bullets
-                        # -----------------------
-                        p.level = 0
-            
-            elif layout_key == "content_with_image":
-                if len(slide.placeholders) > 2:
-                    text_placeholder = slide.placeholders[1]
-                    tf = text_placeholder.text_frame
-                    tf.clear()
-                    for bullet in slide_data.get("bullets", []):
-                        p = tf.add_paragraph()
-                        p.text = str(bullet)
-                        p.level = 0
-                    
-                    image_placeholder = slide.placeholders[2]
-                    if image_path and os.path.exists(image_path):
-                        slide.shapes.add_picture(
-                            image_path,
-                            image_placeholder.left, image_placeholder.top,
-                            width=image_placeholder.width, height=image_placeholder.height
-                        )
-                        self.log(f"Added image {image_path} to slide.")
-
-        self._delete_initial_slide(prs, slides_plan)
-        os.makedirs(output_dir, exist_ok=True)
-        prs.save(output_path)
-        self.update_state("output_path", output_path)
-        self.log(f"Presentation saved successfully to: {output_path}")
+        # Sharded builds are opt-in (config 'build_workers' > 1, for plans of at
+        # least 'shard_threshold' slides): measured, the process start-up and
+        # merge outweigh the parallel build at the sizes this pipeline makes.
+        workers = self.config.get("build_workers") or 1
+        if workers > 1 and len(slides_plan) >= self.config.get("shard_threshold", 200):
+            pptx_bytes = self.build_sharded(template_path, slides_plan, workers)
+        else:
+            pptx_bytes = self.build(template_path, slides_plan)
+
+        # The deck is always serialized in memory; writing it to the job's output
+        # directory is optional (config 'save_to_disk').
+        self.sm.set_artifact("pptx", pptx_bytes)
+        if self.config.get("save_to_disk", True):
+            with open(output_path, "wb") as f:
+                f.write(pptx_bytes)
+            self.update_state("output_path", output_path)
+            self.log(f"Presentation saved successfully to: {output_path}")
+        else:
+            self.log(f"Presentation built in memory ({len(pptx_bytes)} bytes).")
 
 
 
@@ -0,0 +1,164 @@
+# api.py
+# Small HTTP API over the job queue: submit a syllabus PDF, poll the job, download the results.
+#
+# Run with:  uvicorn api:app --host 0.0.0.0 --port 8000
+# or alongside the Streamlit app, in its process:  API_PORT=8000 streamlit run app.py
+
+import os
+import secrets
+import threading
+from fastapi import FastAPI, File, Form, Header, HTTPException, Response, UploadFile
+from job_queue import DONE, QueueFullError, get_job_queue
+from progress import get_metrics
+from scheduler import DEFAULT_TENANT, get_scheduler
+from result_cache import get_result_cache
+
+TEMPLATES_DIR = "templates"
+MEDIA_TYPES = {
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "pdf": "application/pdf",
+}
+
+app = FastAPI(title="AI PPT Generator")
+
+
+def _bearer_token(authorization: str | None) -> str | None:
+    scheme, _, token = (authorization or "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+
+def _require_admin(authorization: str | None):
+    """Operator-only endpoints need `Authorization: Bearer <ADMIN_TOKEN>`; without ADMIN_TOKEN they are off."""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set).")
+    token = _bearer_token(authorization)
+    if token is None or not secrets.compare_digest(token, admin_token):
+        raise HTTPException(status_code=401, detail="Admin token required.")
+
+
+def _resolve_tenant(authorization: str | None, requested: str) -> str:
+    """
+    The tenant a submission is accounted to. With env API_TOKENS
+    ("token=tenant,...") it is the bearer token's tenant, whatever was
+    requested; without it, the requested tenant must be the default one or
+    listed in TENANT_WEIGHTS, so clients cannot mint themselves new shares.
+    """
+    tokens = os.getenv("API_TOKENS")
+    if tokens:
+        token = _bearer_token(authorization)
+        for item in filter(None, (part.strip() for part in tokens.split(","))):
+            known, _, tenant = item.partition("=")
+            if token is not None and secrets.compare_digest(token, known.strip()):
+                return tenant.strip() or DEFAULT_TENANT
+        raise HTTPException(status_code=401, detail="A valid API token is required.")
+    if requested != DEFAULT_TENANT and requested not in get_scheduler().tenant_weights:
+        raise HTTPException(status_code=403, detail=f"Unknown tenant '{requested}'.")
+    return requested
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(file: UploadFile = File(...), theme_file: str = Form("edutor_theme.pptx"),
+               tone: str = Form("Beginner"), slide_count: int = Form(10),
+               tenant: str = Form(DEFAULT_TENANT), interactive: bool = Form(False),
+               checkpoints: bool = Form(False), resume_from: str | None = Form(None),
+               regenerable: bool = Form(False), authorization: str | None = Header(None)):
+    """
+    Queues a generation job for the uploaded PDF and returns its ID straight
+    away. With `checkpoints`, a failed job can be retried with `resume_from`
+    set to its ID, skipping the stages it finished. With `regenerable`, single
+    slides of the finished deck can be regenerated. The job's tenant comes
+    from the caller's API token if tokens are configured. A plain def, so
+    FastAPI runs it in its threadpool: reading, hashing and page-counting the
+    upload would otherwise block the event loop.
+    """
+    if os.path.basename(theme_file) != theme_file or not os.path.exists(os.path.join(TEMPLATES_DIR, theme_file)):
+        raise HTTPException(status_code=400, detail=f"Unknown theme '{theme_file}'.")
+    if tone not in ("Beginner", "Intermediate", "Expert"):
+        raise HTTPException(status_code=400, detail=f"Unknown tone '{tone}'.")
+    if not 1 <= slide_count <= 100:
+        raise HTTPException(status_code=400, detail="slide_count must be between 1 and 100.")
+    tenant = _resolve_tenant(authorization, tenant)
+    try:
+        job_id = get_job_queue().submit(file.file.read(), file.filename or "upload.pdf",
+                                        theme_file, tone, slide_count, tenant=tenant, interactive=interactive,
+                                        checkpoints=checkpoints, resume_from=resume_from,
+                                        regenerable=regenerable)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return get_job_queue().status(job_id)
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    status = get_job_queue().status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return status
+
+
+@app.get("/jobs/{job_id}/artifacts/{kind}")
+def job_artifact(job_id: str, kind: str):
+    """A partial result published while the job runs ("outline", "slides" or "previews")."""
+    job_status(job_id)
+    artifact = get_job_queue().artifact(job_id, kind)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail=f"No '{kind}' yet.")
+    return {"kind": kind, "data": artifact}
+
+
+@app.post("/jobs/{job_id}/slides/{slide_id}")
+def regenerate_job_slide(job_id: str, slide_id: str):
+    """
+    Regenerates one content slide of a finished job submitted with
+    `regenerable`; download the deck again afterwards. A plain def, as it
+    waits for the LLM.
+    """
+    status = job_status(job_id)
+    if status["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}.")
+    if not get_job_queue().regenerate_slide(job_id, slide_id):
+        raise HTTPException(status_code=422, detail=f"Slide '{slide_id}' could not be regenerated.")
+    return get_job_queue().status(job_id)
+
+
+@app.get("/jobs/{job_id}/{kind}")
+def job_result(job_id: str, kind: str):
+    """Downloads the finished job's .pptx or .pdf."""
+    if kind not in MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail=f"No '{kind}' output; use pptx or pdf.")
+    status = job_status(job_id)
+    if status["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}.")
+    data = get_job_queue().result(job_id, kind)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"The job produced no {kind}.")
+    return Response(data, media_type=MEDIA_TYPES[kind],
+                    headers={"Content-Disposition": f'attachment; filename="final_presentation.{kind}"'})
+
+
+@app.delete("/cache")
+def invalidate_cache(pdf_hash: str | None = None, theme_file: str | None = None,
+                     authorization: str | None = Header(None)):
+    """Drops cached results (all of them, or those for a PDF hash and/or theme). Admin only."""
+    _require_admin(authorization)
+    result_cache = get_result_cache()
+    match = {name: value for name, value in (("pdf_hash", pdf_hash), ("theme_file", theme_file)) if value}
+    return {"removed": result_cache.invalidate(**match) if result_cache else 0}
+
+
+def serve_in_background(port: int, host: str = "0.0.0.0"):
+    """
+    Serves the API from a daemon thread of the calling process, so it shares
+    that process's job queue (and worker pool) instead of starting its own.
+    """
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="api-server", daemon=True).start()
+    return server
+
+
+@app.get("/metrics")
+def metrics():
+    """Stage timings and counters aggregated over every job this process has run, and the shared LLM / media capacity."""
+    return {**get_metrics().snapshot(), "scheduler": get_scheduler().snapshot(), "queued": get_job_queue().pending()}
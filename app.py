@@ -1,9 +1,11 @@
 # app.py
-# Updated Streamlit GUI to handle both PPTX and PDF outputs.
+# Streamlit GUI: submits jobs to the background queue and polls them for PPTX and PDF outputs.
 
-import streamlit as st
-from main import run_full_pipeline # Import our updated pipeline function
 import os
+import uuid
+import streamlit as st
+from job_queue import DONE, QueueFullError, get_job_queue # Jobs run on a shared background worker pool
+from workspace import cleanup_stale_workspaces
 
 st.set_page_config(
     page_title="AI PPT Generator",
@@ -14,6 +16,18 @@ st.set_page_config(
 st.title("🤖 AI Multi-Agent Presentation Generator")
 st.markdown("Upload a syllabus PDF and let our AI agents create a complete presentation for you. Customize the tone, length, and design to fit your needs.")
 
+# Remove workspaces left behind by sessions that crashed mid-job
+cleanup_stale_workspaces()
+
+@st.cache_resource
+def start_api(port: int):
+    """Serves api.py from this process (once), so both front ends share one job queue and worker pool."""
+    from api import serve_in_background
+    return serve_in_background(port, host=os.getenv("API_HOST", "0.0.0.0"))
+
+if os.getenv("API_PORT"):
+    start_api(int(os.getenv("API_PORT")))
+
 THEMES = {
     "Edutor Blue (Default)": "edutor_theme.pptx",
     "Dark Mode": "dark_mode.pptx",
@@ -25,66 +39,128 @@ with st.sidebar:
     theme_name = st.selectbox("Select a presentation theme:", options=list(THEMES.keys()))
     selected_theme_file = THEMES[theme_name]
     tone = st.selectbox("Select the content tone:", ("Beginner", "Intermediate", "Expert"), index=0)
-    slide_count = st.slider("Select approximate number of content slides:", min_value=5, max_value=20, value=10)
+    slide_count = st.slider("Select approximate number of slides:", min_value=5, max_value=20, value=10)
+
+def current_tenant() -> str:
+    """Who this session's jobs are accounted to: the signed-in user, else the browser session."""
+    try:
+        email = st.user.get("email")
+    except Exception:
+        email = None
+    if email:
+        return email
+    if "tenant" not in st.session_state:
+        st.session_state.tenant = f"session-{uuid.uuid4().hex[:12]}"
+    return st.session_state.tenant
+
+# A job keeps running in the background queue if the page is refreshed;
+# its ID is kept in the URL so the page can pick it up again.
+if "job_id" not in st.session_state and "job" in st.query_params:
+    st.session_state.job_id = st.query_params["job"]
 
 uploaded_file = st.file_uploader("Choose a syllabus PDF file", type="pdf")
 
 if uploaded_file is not None:
-    temp_dir = "temp_uploads"
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    temp_pdf_path = os.path.join(temp_dir, uploaded_file.name)
-    with open(temp_pdf_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-
     st.success(f"File '{uploaded_file.name}' uploaded successfully!")
 
     if st.button("✨ Generate Presentation", type="primary"):
-        progress_text = st.empty()
-        
-        def update_progress(message):
-            progress_text.text(message)
-
-        with st.spinner("The AI agents are hard at work... This may take a minute or two."):
-            try:
-                # --- Run the pipeline, which now returns two paths ---
-                pptx_path, pdf_path = run_full_pipeline(
-                    pdf_path=temp_pdf_path,
-                    theme_file=selected_theme_file,
-                    tone=tone,
-                    slide_count=slide_count,
-                    progress_callback=update_progress
+        try:
+            st.session_state.job_id = get_job_queue().submit(
+                uploaded_file.getvalue(), uploaded_file.name,
+                theme_file=selected_theme_file, tone=tone, slide_count=slide_count,
+                tenant=current_tenant(), interactive=True, regenerable=True)
+            st.query_params["job"] = st.session_state.job_id
+        except QueueFullError as e:
+            st.error(f"The server is busy, please try again in a few minutes. ({e})")
+
+job_id = st.session_state.get("job_id")
+if job_id:
+    job_queue = get_job_queue()
+    progress_text = st.empty()
+    progress_bar = st.empty()
+    outline_area = st.empty()
+    preview_area = st.empty()
+
+    def show_outline(outline):
+        # Available as soon as the content stage is done
+        with outline_area.container():
+            st.caption("Outline")
+            st.markdown("\n".join(f"- **{chapter['title']}**: {', '.join(chapter['topics'])}"
+                                   for chapter in outline))
+
+    def show_previews(thumbnail_paths):
+        # Drawn from the slide plan while the deck and PDF are still being built
+        with preview_area.container():
+            st.caption("Preview")
+            st.image(thumbnail_paths, width=160)
+
+    with st.spinner("The AI agents are hard at work... This may take a minute or two."):
+        # Poll the job; the work itself runs on the queue's worker threads
+        shown_previews = shown_outline = None
+        while True:
+            job = job_queue.get(job_id)
+            if job is None:
+                break
+            status = job_queue.status(job_id)
+            if "position" in status:
+                progress_text.text(f"Waiting in queue (position {status['position']})...")
+            else:
+                progress_text.text(job.message)
+            event = job.progress
+            if event is not None:
+                eta = f" - about {int(event.eta) + 1}s left" if event.eta else ""
+                progress_bar.progress(event.fraction, text=f"{int(event.fraction * 100)}%{eta}")
+            outline = job.artifacts.get("outline")
+            if outline and outline is not shown_outline:
+                shown_outline = outline
+                show_outline(outline)
+            if job.previews and job.previews is not shown_previews:
+                shown_previews = job.previews
+                show_previews(shown_previews)
+            if job.done.wait(1):
+                break
+
+    if job is None:
+        st.error("This job has expired or is unknown. Please generate the presentation again.")
+    elif job.status == DONE:
+        pptx_bytes = job_queue.result(job_id, "pptx")
+        pdf_bytes = job_queue.result(job_id, "pdf")
+
+        # --- Stream the results to the download buttons ---
+        st.success("🎉 Presentation generated successfully!")
+
+        col1, col2 = st.columns(2) # Create columns for buttons
+
+        with col1:
+            st.download_button(
+                label="📥 Download PPTX",
+                data=pptx_bytes,
+                file_name="final_presentation.pptx",
+                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+            )
+
+        if pdf_bytes:
+            with col2:
+                st.download_button(
+                    label="📄 Download PDF",
+                    data=pdf_bytes,
+                    file_name="final_presentation.pdf",
+                    mime="application/pdf",
                 )
-                
-                # --- Provide download buttons based on generated files ---
-                if pptx_path and os.path.exists(pptx_path):
-                    st.success("🎉 Presentation generated successfully!")
-                    
-                    col1, col2 = st.columns(2) # Create columns for buttons
-                    
-                    with col1:
-                        with open(pptx_path, "rb") as file:
-                            st.download_button(
-                                label="📥 Download PPTX",
-                                data=file,
-                                file_name=os.path.basename(pptx_path),
-                                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                            )
-                    
-                    if pdf_path and os.path.exists(pdf_path):
-                        with col2:
-                            with open(pdf_path, "rb") as file:
-                                st.download_button(
-                                    label="📄 Download PDF",
-                                    data=file,
-                                    file_name=os.path.basename(pdf_path),
-                                    mime="application/pdf",
-                                )
-                    else:
-                        st.warning("PDF conversion failed. Check logs for details.")
-                        
-                else:
-                    st.error("Something went wrong. The presentation could not be generated.")
-
-            except Exception as e:
-                st.error(f"An error occurred: {e}")
\ No newline at end of file
+        else:
+            st.warning("PDF conversion failed. Check logs for details.")
+
+        # Single slides can be redone while the job is kept (see JobQueue result_ttl)
+        content_slides = {f"{s['title']} ({s['id']})": s["id"]
+                          for s in job.artifacts.get("slides") or [] if s["type"] == "content"}
+        if content_slides:
+            with st.expander("🔁 Regenerate a slide"):
+                choice = st.selectbox("Slide to regenerate:", options=list(content_slides))
+                if st.button("Regenerate slide"):
+                    with st.spinner("Regenerating the slide..."):
+                        regenerated = job_queue.regenerate_slide(job_id, content_slides[choice])
+                    if regenerated:
+                        st.rerun()
+                    st.error("The slide could not be regenerated. Please try again.")
+    else:
+        st.error(f"Something went wrong. The presentation could not be generated. ({job.error})")
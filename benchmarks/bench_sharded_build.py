@@ -0,0 +1,78 @@
+# benchmarks/bench_sharded_build.py
+# Compares single-core and sharded PresentationAgent builds on synthetic slide plans.
+#
+# Usage (from the project root):
+#     python benchmarks/bench_sharded_build.py [--workers N] [--sizes 200 500 1000]
+#
+# The pipeline only shards when PresentationAgent config 'build_workers' > 1; use this to decide.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from pptx import Presentation
+from agents.presentation_agent import PresentationAgent
+from models import Slide
+
+TEMPLATE = os.path.join("templates", "edutor_theme.pptx")
+
+
+def make_plan(n_slides: int, image_paths: list[str]) -> list[Slide]:
+    """A plan shaped like FormatAgent output: chapter title, content slides with images, a quiz."""
+    plan = [Slide("slide_1", "main_title", "Benchmark Deck", "Synthetic")]
+    i = 1
+    while len(plan) < n_slides - 1:
+        i += 1
+        if i % 10 == 2:
+            plan.append(Slide(f"slide_{i}", "chapter_title", f"Chapter {i // 10 + 1}", "Overview"))
+        elif i % 10 == 0:
+            plan.append(Slide(f"slide_{i}", "quiz", "Quiz", bullets=[f"Question {q}?" for q in range(5)]))
+        else:
+            plan.append(Slide(f"slide_{i}", "content", f"Topic {i}",
+                              bullets=[f"Key point {b} about topic {i}" for b in range(5)],
+                              image_path=image_paths[i % len(image_paths)]))
+    plan.append(Slide(f"slide_{i + 1}", "thank_you", "Thank You!", "Any Questions?"))
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 500, 1000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_paths = []
+        for k in range(8):
+            path = os.path.join(tmp, f"image_{k}.png")
+            Image.new("RGB", (800, 600), (30 * k, 90, 200 - 20 * k)).save(path)
+            image_paths.append(path)
+
+        agent = PresentationAgent("Benchmark", None)
+        agent.build(TEMPLATE, make_plan(5, image_paths))  # warm template and image caches
+
+        print(f"workers={args.workers}")
+        print(f"{'slides':>7} {'serial (s)':>11} {'sharded (s)':>12} {'speedup':>8}")
+        for size in args.sizes:
+            plan = make_plan(size, image_paths)
+
+            start = time.perf_counter()
+            serial = agent.build(TEMPLATE, plan)
+            serial_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            sharded = agent.build_sharded(TEMPLATE, plan, args.workers)
+            sharded_time = time.perf_counter() - start
+
+            assert len(Presentation(BytesIO(serial)).slides) == len(Presentation(BytesIO(sharded)).slides) == size
+            print(f"{size:>7} {serial_time:>11.2f} {sharded_time:>12.2f} {serial_time / sharded_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
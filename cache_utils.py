@@ -0,0 +1,35 @@
+# cache_utils.py
+# Size-bounded housekeeping shared by the on-disk caches (thumbnails, optimized images).
+
+import os
+
+
+def evict_lru_files(directory: str, max_bytes: int, keep=()) -> int:
+    """
+    Deletes the least recently used files in `directory` (by mtime, which
+    cache hits refresh) until it holds at most `max_bytes`. Files still
+    being written (*.tmp) and the paths in `keep` (those the caller is about
+    to hand out) are left alone. Returns how many were removed.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    entries = []
+    for entry in os.scandir(directory):
+        if not entry.is_file() or entry.name.endswith(".tmp") or os.path.abspath(entry.path) in keep:
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,93 @@
+# image_optimizer.py
+# Downscales and recompresses slide images to the size they are displayed at.
+
+import hashlib
+import os
+import uuid
+from PIL import Image
+from cache_utils import evict_lru_files
+
+EMU_PER_INCH = 914400
+
+
+class ImageOptimizer:
+    """
+    Resizes images to a target placeholder's dimensions (at a given DPI),
+    re-encodes them as JPEG or PNG depending on their content, and caches
+    the optimized variants on disk so repeated builds reuse them. The least
+    recently used variants are evicted once the cache exceeds `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(".cache", "optimized_images"),
+                 dpi: int = 150, jpeg_quality: int = 85, max_bytes: int = 512 << 20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        # key -> optimized path, or None when the original should be used as-is
+        self._memo: dict[str, str | None] = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _target_pixels(self, width_emu: int, height_emu: int) -> tuple[int, int]:
+        """Converts placeholder EMU dimensions into pixels at the configured DPI."""
+        width_px = max(1, round(width_emu / EMU_PER_INCH * self.dpi))
+        height_px = max(1, round(height_emu / EMU_PER_INCH * self.dpi))
+        return width_px, height_px
+
+    @staticmethod
+    def _is_graphic(img: Image.Image) -> bool:
+        """True for images with transparency or a small palette (diagrams, line art)."""
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            alpha = img.convert("RGBA").getchannel("A")
+            if alpha.getextrema()[0] < 255:
+                return True
+        # getcolors returns None when there are more colors than maxcolors
+        return img.convert("RGB").getcolors(maxcolors=256) is not None
+
+    def optimize(self, image_path: str, width_emu: int, height_emu: int) -> str:
+        """
+        Returns the path of an optimized copy of `image_path` sized for a
+        `width_emu` x `height_emu` box. Falls back to the original path if the
+        optimized variant would not be smaller.
+        """
+        with open(image_path, "rb") as f:
+            data = f.read()
+        source_hash = hashlib.sha1(data).hexdigest()
+        target_w, target_h = self._target_pixels(width_emu, height_emu)
+        key = f"{source_hash}_{target_w}x{target_h}_q{self.jpeg_quality}"
+        if key in self._memo and (self._memo[key] is None or os.path.exists(self._memo[key])):
+            return self._memo[key] or image_path
+
+        for ext in (".jpg", ".png"):
+            cached_path = os.path.join(self.cache_dir, key + ext)
+            try:
+                # Marks the variant as recently used, for eviction
+                os.utime(cached_path)
+            except OSError:
+                continue
+            self._memo[key] = cached_path if os.path.getsize(cached_path) < len(data) else None
+            return self._memo[key] or image_path
+
+        with Image.open(image_path) as img:
+            img.load()
+            is_graphic = self._is_graphic(img)
+            # Only ever downscale; each axis independently, since the picture is
+            # stretched to the placeholder box when embedded anyway.
+            new_size = (min(img.width, target_w), min(img.height, target_h))
+            if new_size != img.size:
+                img = img.resize(new_size, Image.Resampling.LANCZOS)
+
+            cached_path = os.path.join(self.cache_dir, key + (".png" if is_graphic else ".jpg"))
+            # Write to a private temp name and rename, so concurrent jobs sharing
+            # the cache never read a half-written file.
+            tmp_path = f"{cached_path}.{uuid.uuid4().hex}.tmp"
+            if is_graphic:
+                img.save(tmp_path, format="PNG", optimize=True)
+            else:
+                img.convert("RGB").save(tmp_path, format="JPEG",
+                                        quality=self.jpeg_quality, optimize=True, progressive=True)
+            os.replace(tmp_path, cached_path)
+        evict_lru_files(self.cache_dir, self.max_bytes, keep=[cached_path])
+
+        self._memo[key] = cached_path if os.path.getsize(cached_path) < len(data) else None
+        return self._memo[key] or image_path
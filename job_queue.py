@@ -0,0 +1,368 @@
+# job_queue.py
+# Background job queue and worker pool, so generation outlives the session or request that submitted it.
+
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import fitz
+from main import regenerate_slide, run_full_pipeline
+from progress import ARTIFACT
+from scheduler import BATCH, DEFAULT_TENANT, INTERACTIVE, PRIORITY_NAMES, SMALL
+from workspace import JobWorkspace
+
+# Job statuses, in lifecycle order
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFullError(Exception):
+    """Raised by JobQueue.submit when the backlog is at its limit."""
+
+
+class Job:
+    """One submitted generation job. Its files live in its own JobWorkspace until it expires."""
+
+    __slots__ = ("job_id", "workspace", "pdf_path", "options", "flight_key", "tenant", "priority", "attached",
+                 "state", "status", "message",
+                 "previews", "progress", "artifacts", "error", "pptx_path", "pdf_path_out", "created_at", "started_at",
+                 "finished_at", "done", "edit_lock")
+
+    def __init__(self, workspace: JobWorkspace, pdf_path: str, options: dict, flight_key: str | None = None,
+                 tenant: str = DEFAULT_TENANT, priority: int = BATCH):
+        self.job_id = workspace.job_id
+        self.workspace = workspace
+        self.pdf_path = pdf_path
+        self.options = options      # run_full_pipeline keyword arguments
+        self.flight_key = flight_key  # identical submissions share this key
+        self.tenant = tenant
+        self.priority = priority    # scheduler.INTERACTIVE, SMALL or BATCH
+        self.attached = 0           # identical submissions coalesced into this job
+        self.state = None           # the running pipeline's StateManager
+        self.status = QUEUED
+        self.message = "Waiting for a worker..."
+        self.previews = []          # latest slide thumbnail paths
+        self.progress = None        # latest progress.ProgressEvent
+        self.artifacts = {}         # partial results by kind ("outline", "slides", "previews")
+        self.error = None
+        self.pptx_path = None
+        self.pdf_path_out = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+        self.edit_lock = threading.Lock()  # held while a slide of the finished deck is regenerated
+
+    def to_dict(self) -> dict:
+        """Status as shown to pollers (no file contents)."""
+        return {
+            "job_id": self.job_id, "tenant": self.tenant, "priority": PRIORITY_NAMES[self.priority],
+            "status": self.status, "message": self.message, "error": self.error,
+            "has_pptx": bool(self.pptx_path), "has_pdf": bool(self.pdf_path_out), "attached": self.attached,
+            "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            "progress": self.progress.to_dict(with_artifact=False) if self.progress else None,
+            "artifacts": sorted(self.artifacts),
+        }
+
+
+class JobQueue:
+    """
+    A bounded queue of generation jobs served by background worker threads,
+    so at most that many pipelines run at once whatever the number of users.
+    Callers submit a PDF and options, get a job ID back immediately, and poll
+    `status()` / fetch `result()` later; the job keeps running if the caller
+    goes away. Finished jobs (and their workspaces) are dropped after `result_ttl` seconds.
+
+    Submissions are single-flight: one identical to a job that is still
+    queued or running (same PDF content and options) does not start another
+    pipeline. It gets its own job ID, which is an alias of the in-flight
+    job, so it sees the same progress, previews and results. If it is more
+    urgent, the in-flight job is raised to its priority.
+
+    Regular workers take queued jobs oldest first; `express_workers` more
+    only take small (at most `small_job_pages` pages) or interactive jobs,
+    most urgent first, so a short deck does not wait for big ones to finish.
+    Within the pipeline, LLM calls and downloads are shared fairly between
+    tenants by scheduler.get_scheduler().
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 100, result_ttl: float = 3600,
+                 express_workers: int = 1, small_job_pages: int = 20):
+        self.result_ttl = result_ttl
+        self.max_queued = max_queued
+        self.small_job_pages = small_job_pages
+        self._pending: list[Job] = []  # in submission order
+        self._ready = threading.Condition()
+        self._closing = False
+        self._jobs: dict[str, Job] = {}
+        # Flight key -> the queued or running job for it, and alias job ID -> job ID
+        self._in_flight: dict[str, Job] = {}
+        self._aliases: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, args=(False,), name=f"job-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        self._threads += [threading.Thread(target=self._work, args=(True,), name=f"job-express-{i}", daemon=True)
+                          for i in range(express_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, pdf_bytes: bytes, filename: str, theme_file: str, tone: str, slide_count: int,
+               tenant: str = DEFAULT_TENANT, interactive: bool = False, resume_from: str | None = None,
+               **options) -> str:
+        """
+        Queues a job for the uploaded PDF and returns its ID. `tenant` is who
+        the job's LLM and download capacity is accounted to; `interactive`
+        marks a job someone is watching, which is served first if it is also
+        small (at most `small_job_pages` pages). `resume_from` is the ID of an
+        earlier, failed job for the same PDF that ran with `checkpoints=True`:
+        its stage checkpoints are copied over and reused where the inputs
+        match. `options` are passed on to run_full_pipeline. Raises
+        QueueFullError if the backlog is full.
+        """
+        self._expire()
+        options = {"theme_file": theme_file, "tone": tone, "slide_count": slide_count, **options}
+        # Identical decks for different tenants still share one run
+        flight_key = self.flight_key(pdf_bytes, options)
+        priority = self._priority(pdf_bytes, interactive)
+        options.update(tenant=tenant, interactive=priority == INTERACTIVE)
+        with self._lock:
+            leader = self._in_flight.get(flight_key)
+            if leader is not None:
+                alias = JobWorkspace.new_job_id()
+                self._aliases[alias] = leader.job_id
+                leader.attached += 1
+                if priority < leader.priority:
+                    self._raise_priority(leader, priority)
+                return alias
+            # Registered before the upload is written, so concurrent identical submissions find it
+            workspace = JobWorkspace(auto_cleanup=False)
+            earlier = self._jobs.get(self._aliases.get(resume_from, resume_from)) if resume_from else None
+            if earlier is not None and earlier.status != FAILED:
+                earlier = None
+            if earlier is not None:
+                options = {**options, "resume": True}
+            job = Job(workspace, os.path.join(workspace.uploads_dir, os.path.basename(filename) or "upload.pdf"),
+                      options, flight_key, tenant, priority)
+            self._jobs[job.job_id] = job
+            self._in_flight[flight_key] = job
+
+        try:
+            with open(job.pdf_path, "wb") as f:
+                f.write(pdf_bytes)
+            if earlier is not None:
+                shutil.copytree(earlier.workspace.checkpoints_dir, workspace.checkpoints_dir, dirs_exist_ok=True)
+            with self._ready:
+                if len(self._pending) >= self.max_queued:
+                    raise queue.Full
+                self._pending.append(job)
+                self._ready.notify_all()
+        except (OSError, queue.Full) as e:
+            # Jobs already attached to this one see it fail
+            job.status, job.error, job.message = FAILED, str(e), "Could not queue the job."
+            job.finished_at = time.time()
+            with self._lock:
+                del self._in_flight[flight_key]
+                orphaned = not job.attached
+                if orphaned:
+                    del self._jobs[job.job_id]
+            job.done.set()
+            if orphaned:
+                workspace.cleanup()
+            if isinstance(e, queue.Full):
+                raise QueueFullError(f"The job queue is full ({self.max_queued} jobs waiting).")
+            raise
+        return job.job_id
+
+    @staticmethod
+    def _raise_priority(job: Job, priority: int):
+        """Serves a queued or running job as `priority` from now on."""
+        job.priority = priority
+        job.options["interactive"] = priority == INTERACTIVE
+        # A running pipeline reads it from its state before every LLM call and download
+        if job.state is not None:
+            job.state.update("interactive", job.options["interactive"])
+
+    def _priority(self, pdf_bytes: bytes, interactive: bool) -> int:
+        """Large uploads are batch work even when someone is waiting for them."""
+        try:
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                pages = doc.page_count
+        except Exception:
+            return BATCH
+        if pages > self.small_job_pages:
+            return BATCH
+        return INTERACTIVE if interactive else SMALL
+
+    @staticmethod
+    def flight_key(pdf_bytes: bytes, options: dict) -> str:
+        """Identifies identical submissions: the PDF's content hash plus the pipeline options."""
+        payload = json.dumps({"pdf": hashlib.sha256(pdf_bytes).hexdigest(), "options": options},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, job_id: str) -> Job | None:
+        """The job for `job_id` (for an alias, the job it was coalesced into)."""
+        with self._lock:
+            return self._jobs.get(self._aliases.get(job_id, job_id))
+
+    def status(self, job_id: str) -> dict | None:
+        """The job's status, latest progress message and timings, or None if unknown or expired."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        status = job.to_dict()
+        if job.job_id != job_id:
+            status.update(job_id=job_id, coalesced_with=job.job_id)
+        if job.status == QUEUED:
+            status["position"] = sum(1 for j in list(self._pending) if j.created_at <= job.created_at)
+        return status
+
+    def result(self, job_id: str, kind: str = "pptx") -> bytes | None:
+        """The finished job's .pptx (or, with kind="pdf", .pdf) bytes; None if not (yet) available."""
+        job = self.get(job_id)
+        path = None
+        if job is not None and job.status == DONE:
+            path = job.pdf_path_out if kind == "pdf" else job.pptx_path
+        if not (path and os.path.exists(path)):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def artifact(self, job_id: str, kind: str):
+        """A partial result the job has published so far (e.g. "outline"), or None."""
+        job = self.get(job_id)
+        return job.artifacts.get(kind) if job is not None else None
+
+    def regenerate_slide(self, job_id: str, slide_id: str) -> bool:
+        """
+        Regenerates one content slide of a finished job that was submitted
+        with `regenerable=True`, patching its deck (and PDF) in place. Returns
+        False if the job is unknown, expired or not done, or the slide could
+        not be regenerated.
+        """
+        job = self.get(job_id)
+        if job is None or job.status != DONE:
+            return False
+        with job.edit_lock:
+            pdf_backend = job.options.get("pdf_backend", "auto") if job.pdf_path_out else None
+            pptx_path = regenerate_slide(job.workspace, slide_id, pdf_backend=pdf_backend)
+            if job.pdf_path_out and not os.path.exists(job.pdf_path_out):
+                job.pdf_path_out = None
+        return bool(pptx_path)
+
+    def wait(self, job_id: str, timeout: float | None = None) -> bool:
+        """Blocks until the job has finished. Returns False on timeout or for unknown jobs."""
+        job = self.get(job_id)
+        return bool(job and job.done.wait(timeout))
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _run(self, job: Job):
+        def on_progress(message):
+            job.message = message
+
+        def on_previews(paths):
+            job.previews = paths
+
+        def on_event(event):
+            if event.kind == ARTIFACT:
+                job.artifacts[event.artifact_kind] = event.artifact
+            job.progress = event
+
+        def on_state(sm):
+            with self._lock:
+                job.state = sm
+                # Raised by a submission that attached after the options were read
+                sm.update("interactive", job.options["interactive"])
+
+        pptx_path, pdf_path = run_full_pipeline(
+            job.pdf_path, progress_callback=on_progress, preview_callback=on_previews,
+            workspace=job.workspace, event_callback=on_event, state_callback=on_state, **job.options)
+        job.pptx_path, job.pdf_path_out = pptx_path, pdf_path
+        if not pptx_path:
+            raise RuntimeError("The presentation could not be generated.")
+
+    def _next(self, express: bool) -> Job | None:
+        """The next job for a worker to run; None once the queue is shut down (and, for regular workers, drained)."""
+        with self._ready:
+            while True:
+                if express:
+                    job = min((j for j in self._pending if j.priority != BATCH),
+                              key=lambda j: (j.priority, j.created_at), default=None)
+                else:
+                    job = self._pending[0] if self._pending else None
+                if job is not None:
+                    self._pending.remove(job)
+                    return job
+                if self._closing:
+                    return None
+                self._ready.wait()
+
+    def _work(self, express: bool):
+        while True:
+            job = self._next(express)
+            if job is None:
+                return
+            job.status, job.started_at = RUNNING, time.time()
+            try:
+                self._run(job)
+                job.status, job.message = DONE, "Done."
+            except Exception as e:
+                print(f"Job {job.job_id} failed: {e}")
+                job.status, job.error, job.message = FAILED, str(e), "Generation failed."
+            finally:
+                job.finished_at = time.time()
+                job.state = None
+                with self._lock:
+                    # Later identical submissions start afresh (or hit the result cache)
+                    if self._in_flight.get(job.flight_key) is job:
+                        del self._in_flight[job.flight_key]
+                job.done.set()
+
+    def _expire(self):
+        """Forgets finished jobs older than `result_ttl` and deletes their workspaces."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            # A deck that is being edited is kept until the next sweep
+            expired = [job for job in self._jobs.values()
+                       if job.finished_at and job.finished_at < cutoff and not job.edit_lock.locked()]
+            for job in expired:
+                del self._jobs[job.job_id]
+            expired_ids = {job.job_id for job in expired}
+            self._aliases = {alias: job_id for alias, job_id in self._aliases.items() if job_id not in expired_ids}
+        for job in expired:
+            job.workspace.cleanup()
+
+    def shutdown(self, wait: bool = True):
+        """Stops the workers once the jobs already queued have run."""
+        with self._ready:
+            self._closing = True
+            self._ready.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Returns the process-wide JobQueue (worker count from env JOB_WORKERS,
+    default 2; express workers for small and interactive jobs from env
+    JOB_EXPRESS_WORKERS, default 1; backlog limit from env JOB_QUEUE_LIMIT,
+    default 100). Separate processes get separate queues, so the Streamlit
+    app and the HTTP API share one only when run in the same process
+    (API_PORT, see app.py).
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(workers=int(os.getenv("JOB_WORKERS", "2")),
+                                  max_queued=int(os.getenv("JOB_QUEUE_LIMIT", "100")),
+                                  express_workers=int(os.getenv("JOB_EXPRESS_WORKERS", "1")))
+        return _job_queue
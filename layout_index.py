@@ -0,0 +1,145 @@
+# layout_index.py
+# Maps slide kinds to template layouts by inspecting placeholder metadata.
+
+from pptx.enum.shapes import PP_PLACEHOLDER
+from text_fit import placeholder_text_style
+
+TITLE_TYPES = (PP_PLACEHOLDER.TITLE, PP_PLACEHOLDER.CENTER_TITLE)
+BODY_TYPES = (PP_PLACEHOLDER.BODY, PP_PLACEHOLDER.OBJECT)
+IGNORED_TYPES = (PP_PLACEHOLDER.DATE, PP_PLACEHOLDER.FOOTER, PP_PLACEHOLDER.SLIDE_NUMBER)
+
+# Slide kinds the PresentationAgent asks for, and what to use when a template lacks one
+SLIDE_KINDS = ("title", "content", "content_with_image", "title_only")
+KIND_FALLBACKS = {
+    "title": ("content",),
+    "content": (),
+    "content_with_image": ("content",),
+    "title_only": ("content", "title"),
+}
+
+
+class LayoutSpec:
+    """Which layout to use for a slide kind, and the placeholder idx of each role in it."""
+
+    __slots__ = ("layout_position", "layout_name", "title_idx", "subtitle_idx",
+                 "body_idx", "body_box", "body_style", "image_idx", "image_box")
+
+    def __init__(self, layout_position: int, layout_name: str, title_idx=None, subtitle_idx=None,
+                 body_idx=None, body_box=None, body_style=None, image_idx=None, image_box=None):
+        self.layout_position = layout_position
+        self.layout_name = layout_name
+        self.title_idx = title_idx
+        self.subtitle_idx = subtitle_idx
+        self.body_idx = body_idx
+        self.body_box = body_box    # (left, top, width, height) in EMU
+        self.body_style = body_style  # text_fit.TextStyle of the body placeholder
+        self.image_idx = image_idx
+        self.image_box = image_box  # (left, top, width, height) in EMU
+
+
+def _box(ph) -> tuple[int, int, int, int]:
+    return (ph.left or 0, ph.top or 0, ph.width or 0, ph.height or 0)
+
+
+def _area(ph) -> int:
+    return (ph.width or 0) * (ph.height or 0)
+
+
+def _is_vertical(ph) -> bool:
+    return any(v.startswith(("vert", "eaVert", "wordArtVert", "mongolianVert"))
+               for v in ph._element.xpath(".//a:bodyPr/@vert"))
+
+
+def _candidates(position: int, layout) -> dict[str, tuple[int, LayoutSpec]]:
+    """Scores one layout for every slide kind it can serve. Higher score wins."""
+    titles, subtitles, bodies, pictures = [], [], [], []
+    for ph in layout.placeholders:
+        ph_type = ph.placeholder_format.type
+        if ph_type in IGNORED_TYPES:
+            continue
+        if ph_type in TITLE_TYPES:
+            titles.append(ph)
+        elif ph_type == PP_PLACEHOLDER.SUBTITLE:
+            subtitles.append(ph)
+        elif ph_type in BODY_TYPES and not _is_vertical(ph):
+            bodies.append(ph)
+        elif ph_type == PP_PLACEHOLDER.PICTURE:
+            pictures.append(ph)
+
+    found = {}
+    if not titles:
+        return found
+    title = titles[0]
+    is_center_title = title.placeholder_format.type == PP_PLACEHOLDER.CENTER_TITLE
+
+    def spec(**roles):
+        return LayoutSpec(position, layout.name, title_idx=title.placeholder_format.idx, **roles)
+
+    if subtitles or (len(bodies) == 1 and not pictures):
+        sub = subtitles[0] if subtitles else bodies[0]
+        score = 2 * bool(subtitles) + is_center_title
+        found["title"] = (score, spec(subtitle_idx=sub.placeholder_format.idx))
+
+    if len(bodies) == 1 and not pictures and not subtitles:
+        body = bodies[0]
+        found["content"] = (_area(body), spec(body_idx=body.placeholder_format.idx, body_box=_box(body),
+                                              body_style=placeholder_text_style(body, layout.slide_master)))
+
+    if bodies and (pictures or len(bodies) == 2) and not subtitles:
+        if pictures:
+            image = max(pictures, key=_area)
+            text = max(bodies, key=_area)
+            score = 2
+        else:
+            # Two content areas: text on the left, image on the right
+            text, image = sorted(bodies, key=lambda ph: ph.left or 0)
+            score = 1
+        found["content_with_image"] = (score, spec(
+            body_idx=text.placeholder_format.idx, body_box=_box(text),
+            body_style=placeholder_text_style(text, layout.slide_master),
+            image_idx=image.placeholder_format.idx, image_box=_box(image)))
+
+    if not bodies and not pictures and not subtitles:
+        found["title_only"] = (1, spec())
+
+    return found
+
+
+def build_layout_index(prs) -> dict[str, LayoutSpec]:
+    """
+    Returns a LayoutSpec for every kind in SLIDE_KINDS. Kinds the template
+    cannot serve directly resolve through KIND_FALLBACKS, and ultimately to
+    the first layout, so lookups never fail.
+    """
+    best: dict[str, tuple[int, int, LayoutSpec]] = {}
+    for position, layout in enumerate(prs.slide_layouts):
+        for kind, (score, spec) in _candidates(position, layout).items():
+            # Ties go to the earlier layout
+            if kind not in best or score > best[kind][0]:
+                best[kind] = (score, position, spec)
+
+    index = {kind: entry[2] for kind, entry in best.items()}
+    for kind in SLIDE_KINDS:
+        if kind in index:
+            continue
+        for fallback in KIND_FALLBACKS[kind]:
+            if fallback in index:
+                index[kind] = index[fallback]
+                break
+        else:
+            first = prs.slide_layouts[0]
+            title_idx = next((ph.placeholder_format.idx for ph in first.placeholders
+                              if ph.placeholder_format.type in TITLE_TYPES), None)
+            index[kind] = LayoutSpec(0, first.name, title_idx=title_idx)
+    return index
+
+
+def slide_kind(slide_type: str, has_image: bool) -> str:
+    """Maps a slide plan 'type' to the layout kind it is built with."""
+    if slide_type in ("main_title", "chapter_title"):
+        return "title"
+    if slide_type == "thank_you":
+        return "title_only"
+    if slide_type == "content" and has_image:
+        return "content_with_image"
+    return "content"
@@ -7,95 +7,477 @@ from agents.format_agent import FormatAgent
 from agents.design_agent import DesignAgent
 from agents.external_media_agent import ExternalMediaAgent
 from agents.presentation_agent import PresentationAgent
+from workspace import JobWorkspace
+from pdf_converter import get_conversion_pool, convert_batch, find_office_binary
+from pdf_renderer import render_pdf
+from thumbnails import ThumbnailRenderer
+from state_store import SQLiteStateStore
+from result_cache import ResultCache, get_result_cache
+from progress import PROGRESS, STAGE_START, ProgressTracker, get_metrics
+from scheduler import DEFAULT_TENANT
+import hashlib
 import os
+import shutil
 import time
 import subprocess # Import the subprocess module
 
+FINAL_STATE_FILE = "final_state.json"
+# Part of every result cache key; bump it when a change alters the generated decks
+PIPELINE_VERSION = "2"
+
+def convert_to_pdf(pptx_path: str, progress_callback=None) -> str | None:
+    """
+    Converts a .pptx to PDF next to it using LibreOffice. Returns the PDF path, or None on failure.
+    Uses the warm conversion pool (pdf_converter.py) when the UNO bindings are available,
+    and otherwise, or if that fails, a cold `soffice` run.
+    """
+    if progress_callback: progress_callback("Converting to PDF...")
+    else: print("Converting to PDF using LibreOffice...")
+
+    pool = get_conversion_pool()
+    if pool is not None:
+        pdf_output_path = pool.convert(pptx_path)
+        if pdf_output_path and os.path.exists(pdf_output_path):
+            if progress_callback: progress_callback(f"Successfully converted to PDF: {os.path.basename(pdf_output_path)}")
+            else: print(f"Successfully converted to PDF: {pdf_output_path}")
+            return pdf_output_path
+        print("Falling back to a cold LibreOffice start.")
+
+    output_dir = os.path.dirname(pptx_path)
+    try:
+        # On Windows, the command might be 'soffice' instead of 'libreoffice'
+        commands_to_try = [
+            ['soffice', '--headless', '--convert-to', 'pdf', pptx_path, '--outdir', output_dir],
+            ['libreoffice', '--headless', '--convert-to', 'pdf', pptx_path, '--outdir', output_dir]
+        ]
+
+        for cmd in commands_to_try:
+            try:
+                # Run the command, wait for it to complete, capture output
+                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60) # Added timeout
+                pdf_output_path = os.path.splitext(pptx_path)[0] + ".pdf"
+                if progress_callback: progress_callback(f"Successfully converted to PDF: {os.path.basename(pdf_output_path)}")
+                else: print(f"Successfully converted to PDF: {pdf_output_path}")
+                return pdf_output_path
+            except FileNotFoundError:
+                # This means the command (soffice or libreoffice) wasn't found in PATH
+                continue
+            except subprocess.TimeoutExpired:
+                 print(f"Conversion timed out with '{cmd[0]}'.")
+                 continue
+            except subprocess.CalledProcessError as e:
+                # This means the command ran but reported an error
+                print(f"Error during conversion with '{cmd[0]}': {e.stderr.decode()}")
+                continue
+
+        if progress_callback: progress_callback("PDF Conversion Failed: LibreOffice not found or PATH not set correctly.")
+        else: print("Could not convert to PDF. Ensure LibreOffice is installed and its 'program' directory is in your system PATH.")
+
+    except Exception as e:
+        if progress_callback: progress_callback(f"PDF Conversion Failed: An unexpected error occurred.")
+        else: print(f"An unexpected error occurred during PDF conversion: {e}")
+    return None
+
+def _template_path(sm: StateManager) -> str | None:
+    template_path = (sm.get("design") or {}).get("template_path")
+    return template_path if template_path and os.path.exists(template_path) else None
+
+def send_previews(sm: StateManager, preview_callback):
+    """
+    Passes a list of thumbnail PNG paths (one per slide, in deck order) for
+    the current slide plan to `preview_callback`. Only slides that changed
+    since the last preview are drawn.
+    """
+    if not preview_callback:
+        return
+    template_path = _template_path(sm)
+    try:
+        slides_plan = PresentationAgent("PresentationAgent", sm).paginate(template_path, sm.get("slides") or [])
+        thumbnail_paths = ThumbnailRenderer().render(slides_plan, template_path)
+        preview_callback(thumbnail_paths)
+        if sm.progress:
+            sm.progress.artifact("previews", thumbnail_paths)
+    except Exception as e:
+        print(f"Could not render slide previews: {e}")
+
+def render_plan_to_pdf(sm: StateManager, progress_callback=None) -> bytes | None:
+    """
+    Draws the job's slide plan straight to PDF with PyMuPDF (pdf_renderer.py),
+    without LibreOffice. Returns the PDF bytes, or None on failure.
+    """
+    if progress_callback: progress_callback("Rendering PDF...")
+    template_path = _template_path(sm)
+    try:
+        presentation_agent = PresentationAgent("PresentationAgent", sm)
+        # Same continuation slides as the .pptx
+        slides_plan = presentation_agent.paginate(template_path, sm.get("slides") or [])
+        return render_pdf(slides_plan, template_path, presentation_agent.image_optimizer)
+    except Exception as e:
+        print(f"Native PDF rendering failed: {e}")
+        return None
+
+def pdf_next_to(sm: StateManager, pptx_path: str, pdf_backend: str = "auto", progress_callback=None) -> str | None:
+    """
+    Makes the PDF of the job's deck next to `pptx_path` with `pdf_backend`
+    (see run_full_pipeline). Returns its path, or None on failure.
+    """
+    pdf_output_path = None
+    if pdf_backend != "native":
+        pdf_output_path = convert_to_pdf(pptx_path, progress_callback)
+    if pdf_output_path is None and pdf_backend != "libreoffice":
+        pdf_bytes = render_plan_to_pdf(sm, progress_callback)
+        if pdf_bytes:
+            pdf_output_path = os.path.splitext(pptx_path)[0] + ".pdf"
+            with open(pdf_output_path, "wb") as f:
+                f.write(pdf_bytes)
+    return pdf_output_path
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _assets_present(sm: StateManager) -> bool:
+    """True if every image the slide plan points at still exists (checked before reusing media)."""
+    return all(os.path.exists(s.image_path) for s in sm.get("slides") or [] if s.image_path)
+
+def _cached_result(result_cache: ResultCache, cache_key: str, workspace: JobWorkspace, in_memory: bool,
+                   convert_pdf: bool):
+    """A cached (pptx, pdf) in the form run_full_pipeline returns, or None on a miss."""
+    cached = result_cache.get(cache_key)
+    if not cached or (convert_pdf and cached[1] is None):
+        return None
+    pptx_path, pdf_path = cached if convert_pdf else (cached[0], None)
+    try:
+        if in_memory:
+            with open(pptx_path, "rb") as f:
+                pptx = f.read()
+            pdf = None
+            if pdf_path:
+                with open(pdf_path, "rb") as f:
+                    pdf = f.read()
+            return pptx, pdf
+        # Copied into the job's workspace, so the caller owns its outputs as usual
+        outputs = []
+        for path in (pptx_path, pdf_path):
+            if path:
+                outputs.append(shutil.copy(path, os.path.join(workspace.output_dir, os.path.basename(path))))
+            else:
+                outputs.append(None)
+        return tuple(outputs)
+    except OSError:
+        # Evicted while being read
+        return None
+
 # The main pipeline function remains the same
-def run_full_pipeline(pdf_path: str, theme_file: str, tone: str, slide_count: int, progress_callback=None):
+def run_full_pipeline(pdf_path: str, theme_file: str, tone: str, slide_count: int, progress_callback=None,
+                      workspace: JobWorkspace | None = None, in_memory: bool = False,
+                      presentation_config: dict | None = None, convert_pdf: bool = True,
+                      pdf_backend: str = "auto", preview_callback=None, snapshots: str | None = None,
+                      resume: bool = False, state_store: SQLiteStateStore | None = None, use_cache: bool = True,
+                      event_callback=None, tenant: str = DEFAULT_TENANT, interactive: bool = False,
+                      checkpoints: bool | None = None, regenerable: bool = False, state_callback=None):
+    """
+    Runs every agent for one job. All intermediate and output files are written
+    inside `workspace` (a fresh one is created if not given); the caller owns it
+    and is responsible for cleaning it up once the outputs have been consumed.
+
+    Returns (pptx, pdf). By default these are file paths; with `in_memory=True`
+    the deck is never saved to the output directory and both are returned as
+    bytes instead (pdf is None if conversion failed). `presentation_config` is
+    passed to the PresentationAgent (e.g. {"writer": "streaming"}, "image_dpi").
+    With `convert_pdf=False` the PDF step is skipped (pdf is None), e.g. so
+    run_course_pipeline can convert all decks in one batch.
+    `pdf_backend` picks how the PDF is made: "libreoffice" converts the .pptx,
+    "native" draws the slide plan directly (sub-second, no LibreOffice needed),
+    and "auto" tries LibreOffice first and falls back to the native renderer.
+    `preview_callback`, if given, receives slide thumbnail paths as soon as the
+    plan and theme are known, and again once the visuals are in.
+    `snapshots` ("json" or "json.gz", default from env STATE_SNAPSHOTS) turns on
+    the agents' per-stage state snapshots for debugging; they are off by default.
+    With `regenerable=True` the final state is kept with the job (in the
+    workspace, or in `state_store`), so regenerate_slide can patch it later.
+
+    With `checkpoints` on (default: env PIPELINE_CHECKPOINTS, or `resume`),
+    the outputs of each of the content, format, design and media stages are
+    durably checkpointed in the workspace together with a hash of its inputs.
+    With `resume=True` (and the workspace of an earlier, failed run that had
+    checkpoints on) every stage whose inputs are unchanged is restored from
+    its checkpoint instead of re-run, so a late failure does not repeat the
+    LLM calls. Checkpoints are off by default: each costs an fsync per stage.
+
+    `state_store` (default: a SQLiteStateStore at env STATE_DB, if set) is the
+    job's state backend: every state update is written through to it, and it
+    records the job's chapters, slides, assets, status and stage timings.
+
+    With `use_cache` (and the result cache enabled, see result_cache.py) a
+    request identical to an earlier one - same PDF content, theme (and
+    template file), tone, slide count, PDF backend, presentation config and
+    PIPELINE_VERSION - returns the stored deck and PDF without running any agent.
+
+    `event_callback`, if given, receives the job's structured progress stream
+    (progress.ProgressEvent): stage starts and ends, chunk / slide i of N,
+    bytes downloaded, overall fraction and ETA, and partial artifacts (the
+    outline, the slide plan, preview thumbnails). `progress_callback` gets
+    the messages of the same stream, and process-wide metrics are fed from it.
+
+    LLM calls and image downloads share the process-wide capacity of
+    scheduler.get_scheduler() with every other running job: `tenant` is the
+    department (or other account) the job is queued fairly under, and
+    `interactive=True` puts its calls ahead of batch work. `state_callback`,
+    if given, receives the job's StateManager as soon as it exists, so the
+    caller can raise a running job's priority (its "interactive" key).
+    """
     if not os.path.exists(pdf_path):
         print(f"ERROR: Input PDF not found at '{pdf_path}'.")
         return None
 
     start_time = time.time()
-
-    sm = StateManager()
+    if checkpoints is None:
+        checkpoints = resume or os.getenv("PIPELINE_CHECKPOINTS", "").lower() in ("1", "true", "yes")
+
+    if workspace is None:
+        workspace = JobWorkspace(auto_cleanup=False)
+    pdf_hash = _file_hash(pdf_path)
+    if state_store is None and os.getenv("STATE_DB"):
+        state_store = SQLiteStateStore(os.getenv("STATE_DB"))
+    if state_store:
+        state_store.create_job(workspace.job_id, pdf_hash=pdf_hash, pdf_path=pdf_path, theme_file=theme_file,
+                               tone=tone, slide_count=slide_count)
+    # With a store, every state update is written through to it
+    sm = StateManager(workspace, snapshots=snapshots or os.getenv("STATE_SNAPSHOTS") or None, backend=state_store)
     sm.update("input_pdf_path", pdf_path)
     sm.update("theme_file", theme_file)
     sm.update("tone", tone)
     sm.update("slide_count", slide_count)
+    sm.update("tenant", tenant)
+    sm.update("interactive", interactive)
+    if state_callback:
+        state_callback(sm)
+
+    metrics = get_metrics()
+    tracker = ProgressTracker(sm.job_id, weights=metrics.stage_weights())
+    sm.progress = tracker
+    tracker.subscribe(metrics.record)
+    if event_callback:
+        tracker.subscribe(event_callback)
+    if progress_callback:
+        def forward_message(event):
+            if event.message and event.kind in (STAGE_START, PROGRESS):
+                progress_callback(event.message)
+        tracker.subscribe(forward_message)
+    if state_store:
+        tracker.subscribe(state_store.record_event)
+
+    result_cache = get_result_cache() if use_cache else None
+    if result_cache:
+        template_path = os.path.join("templates", theme_file)
+        cache_meta = {"pdf_hash": pdf_hash, "theme_file": theme_file, "tone": tone, "slide_count": slide_count,
+                      "template": _file_hash(template_path) if os.path.exists(template_path) else None,
+                      "pdf_backend": pdf_backend, "presentation_config": presentation_config or {},
+                      "version": PIPELINE_VERSION}
+        cache_key = result_cache.key(cache_meta)
+        cached = _cached_result(result_cache, cache_key, workspace, in_memory, convert_pdf)
+        if cached:
+            tracker.start_stage("cache", "Found an identical earlier result; reusing it.")
+            tracker.end_stage()
+            tracker.finish()
+            if state_store:
+                state_store.set_status(sm.job_id, "done", output_path=None if in_memory else cached[0])
+            print(f"Pipeline (job {sm.job_id}) served from the result cache in {time.time() - start_time:.2f} seconds.")
+            return cached
+
+    def cache_result(pptx, pdf):
+        if result_cache and pptx and sm.get("failures"):
+            # A degraded deck must not be handed to every identical request
+            print(f"Result not cached: {len(sm.get('failures'))} step(s) failed during generation.")
+        elif result_cache and pptx:
+            try:
+                result_cache.put(cache_key, pptx, pdf, cache_meta)
+            except OSError as e:
+                print(f"WARNING: Could not cache the result: {e}")
 
     content_agent = ContentAgent("ContentAgent", sm)
     format_agent = FormatAgent("FormatAgent", sm)
     design_agent = DesignAgent("DesignAgent", sm)
     media_agent = ExternalMediaAgent("MediaAgent", sm)
-    presentation_agent = PresentationAgent("PresentationAgent", sm)
-
-    if progress_callback: progress_callback("Step 1/5: Understanding content with AI...")
-    content_agent.run()
-
-    if progress_callback: progress_callback("Step 2/5: Planning slide structure...")
-    format_agent.run()
-
-    if progress_callback: progress_callback("Step 3/5: Applying design theme...")
-    design_agent.run()
-
-    if progress_callback: progress_callback("Step 4/5: Generating/Fetching visuals...")
-    media_agent.run()
-
-    if progress_callback: progress_callback("Step 5/5: Building final presentation...")
-    presentation_agent.run()
+    presentation_agent = PresentationAgent("PresentationAgent", sm,
+                                           config={"save_to_disk": not in_memory, **(presentation_config or {})})
+
+    # (stage, progress message, agent, inputs, output state keys, check before reusing a checkpoint)
+    stages = [
+        ("content", "Step 1/5: Understanding content with AI...", content_agent,
+         lambda: {"pdf": pdf_hash, "tone": tone, "slide_count": slide_count}, ("chapters",), None),
+        ("format", "Step 2/5: Planning slide structure...", format_agent,
+         lambda: {"chapters": sm.get("chapters"), "slide_count": slide_count}, ("slides", "provenance"), None),
+        ("design", "Step 3/5: Applying design theme...", design_agent,
+         lambda: {"theme_file": theme_file}, ("design",), None),
+        ("media", "Step 4/5: Generating/Fetching visuals...", media_agent,
+         lambda: {"slides": sm.get("slides")}, ("slides",), _assets_present),
+    ]
+    try:
+        for stage, message, agent, inputs, outputs, is_reusable in stages:
+            input_hash = sm.hash_inputs(inputs())
+            if resume and sm.restore_checkpoint(stage, input_hash) and (is_reusable is None or is_reusable(sm)):
+                tracker.start_stage(stage, f"{message} (resumed from checkpoint)")
+                tracker.end_stage(resumed=True)
+            else:
+                tracker.start_stage(stage, message)
+                failures = len(sm.get("failures") or [])
+                agent.run()
+                # Stages that produced nothing, or degraded output, are not checkpointed, so a resume retries them
+                if checkpoints and all(sm.get(key) for key in outputs) and len(sm.get("failures") or []) == failures:
+                    sm.write_checkpoint(stage, input_hash, outputs)
+                tracker.end_stage()
+            # Partial results, available long before the deck is
+            if stage == "content":
+                tracker.artifact("outline", [{"title": ch.title, "topics": [t.title for t in ch.topics]}
+                                             for ch in sm.get("chapters") or []])
+            elif stage == "format":
+                tracker.artifact("slides", [{"id": s.id, "type": s.type, "title": s.title}
+                                            for s in sm.get("slides") or []])
+            if stage in ("design", "media"):
+                send_previews(sm, preview_callback)
+
+        tracker.start_stage("presentation", "Step 5/5: Building final presentation...")
+        presentation_agent.run()
+        tracker.end_stage()
+    except Exception as e:
+        if state_store: state_store.set_status(sm.job_id, "failed", error=str(e))
+        tracker.finish(ok=False, message=f"Generation failed: {e}")
+        raise
+    tracker.start_stage("pdf")
 
     # --- RE-ADD PDF CONVERSION STEP using LibreOffice ---
+    # Keep the final state with the job, so single slides can be regenerated later
+    if regenerable and state_store is None:
+        sm.save(FINAL_STATE_FILE)
+    if in_memory:
+        pptx_bytes = sm.get_artifact("pptx")
+        pdf_bytes = None
+        if pptx_bytes and convert_pdf and pdf_backend != "native":
+            # LibreOffice only converts files, so the deck touches disk just for the conversion
+            scratch_path = os.path.join(workspace.output_dir, f"{sm.job_id}.pptx")
+            with open(scratch_path, "wb") as f:
+                f.write(pptx_bytes)
+            pdf_output_path = convert_to_pdf(scratch_path, tracker.note)
+            os.remove(scratch_path)
+            if pdf_output_path and os.path.exists(pdf_output_path):
+                with open(pdf_output_path, "rb") as f:
+                    pdf_bytes = f.read()
+                os.remove(pdf_output_path)
+        if pptx_bytes and convert_pdf and pdf_bytes is None and pdf_backend != "libreoffice":
+            pdf_bytes = render_plan_to_pdf(sm, tracker.note)
+        tracker.end_stage()
+        tracker.finish(ok=bool(pptx_bytes))
+        if state_store: state_store.set_status(sm.job_id, "done" if pptx_bytes else "failed")
+        cache_result(pptx_bytes, pdf_bytes)
+        sm.flush()
+        print(f"Pipeline (job {sm.job_id}) finished in {time.time() - start_time:.2f} seconds.")
+        return pptx_bytes, pdf_bytes
+
     pptx_path = sm.get("output_path")
     pdf_output_path = None # Variable to store the final PDF path
-    if pptx_path and os.path.exists(pptx_path):
-        if progress_callback: progress_callback("Converting to PDF...")
-        else: print("Converting to PDF using LibreOffice...")
-        
-        output_dir = os.path.dirname(pptx_path)
-        try:
-            # On Windows, the command might be 'soffice' instead of 'libreoffice'
-            commands_to_try = [
-                ['soffice', '--headless', '--convert-to', 'pdf', pptx_path, '--outdir', output_dir],
-                ['libreoffice', '--headless', '--convert-to', 'pdf', pptx_path, '--outdir', output_dir]
-            ]
-            
-            command_success = False
-            for cmd in commands_to_try:
-                try:
-                    # Run the command, wait for it to complete, capture output
-                    result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60) # Added timeout
-                    pdf_output_path = pptx_path.replace(".pptx", ".pdf")
-                    if progress_callback: progress_callback(f"Successfully converted to PDF: {os.path.basename(pdf_output_path)}")
-                    else: print(f"Successfully converted to PDF: {pdf_output_path}")
-                    command_success = True
-                    break # Exit loop if a command succeeds
-                except FileNotFoundError:
-                    # This means the command (soffice or libreoffice) wasn't found in PATH
-                    continue
-                except subprocess.TimeoutExpired:
-                     print(f"Conversion timed out with '{cmd[0]}'.")
-                     continue
-                except subprocess.CalledProcessError as e:
-                    # This means the command ran but reported an error
-                    print(f"Error during conversion with '{cmd[0]}': {e.stderr.decode()}")
-                    continue
-
-            if not command_success:
-                 if progress_callback: progress_callback("PDF Conversion Failed: LibreOffice not found or PATH not set correctly.")
-                 else: print("Could not convert to PDF. Ensure LibreOffice is installed and its 'program' directory is in your system PATH.")
-
-        except Exception as e:
-            if progress_callback: progress_callback(f"PDF Conversion Failed: An unexpected error occurred.")
-            else: print(f"An unexpected error occurred during PDF conversion: {e}")
+    if convert_pdf and pptx_path and os.path.exists(pptx_path):
+        pdf_output_path = pdf_next_to(sm, pptx_path, pdf_backend, tracker.note)
     # -----------------------------
+    tracker.end_stage()
+    tracker.finish(ok=bool(pptx_path))
+    if state_store: state_store.set_status(sm.job_id, "done" if pptx_path else "failed")
+    cache_result(pptx_path if pptx_path and os.path.exists(pptx_path) else None, pdf_output_path)
 
+    sm.flush()
     end_time = time.time()
-    print(f"Pipeline finished in {end_time - start_time:.2f} seconds.")
+    print(f"Pipeline (job {sm.job_id}) finished in {end_time - start_time:.2f} seconds.")
     
     # Return both paths if conversion was successful, otherwise just the pptx path
-    return pptx_path, pdf_output_path if command_success else None
+    return pptx_path, pdf_output_path
+
+def run_course_pipeline(pdf_paths: list[str], theme_file: str, tone: str, slide_count: int, progress_callback=None,
+                        presentation_config: dict | None = None, pdf_backend: str = "auto"):
+    """
+    Generates one deck per lecture PDF (e.g. a whole course), then converts
+    all finished decks to PDF together instead of starting LibreOffice once
+    per deck. Each lecture gets its own workspace. Returns a list of
+    (pptx_path, pdf_path) in input order, without one lecture's failure
+    affecting the others: a lecture whose pipeline failed gets (None, None),
+    and one whose deck was built but not converted gets (pptx_path, None).
+    With the native PDF backend (or "auto" without LibreOffice) each deck's PDF
+    is rendered directly as part of its own pipeline run instead.
+    """
+    native = pdf_backend == "native" or (pdf_backend == "auto" and find_office_binary() is None)
+    results = []
+    for i, pdf_path in enumerate(pdf_paths, start=1):
+        if progress_callback: progress_callback(f"Lecture {i}/{len(pdf_paths)}: {os.path.basename(pdf_path)}")
+        try:
+            result = run_full_pipeline(pdf_path, theme_file, tone, slide_count, progress_callback,
+                                       presentation_config=presentation_config, convert_pdf=native,
+                                       pdf_backend="native" if native else pdf_backend)
+        except Exception as e:
+            print(f"ERROR: Pipeline failed for '{pdf_path}': {e}")
+            result = None
+        results.append(result if native else (result[0] if result else None))
+    if native:
+        return [result or (None, None) for result in results]
+
+    finished = [pptx_path for pptx_path in results if pptx_path and os.path.exists(pptx_path)]
+    if progress_callback: progress_callback(f"Converting {len(finished)} decks to PDF...")
+    pdf_paths_by_deck = convert_batch(finished) if finished else {}
+    return [(pptx_path, pdf_paths_by_deck.get(pptx_path)) if pptx_path else (None, None) for pptx_path in results]
+
+def regenerate_slide(workspace: JobWorkspace, slide_id: str, pptx_bytes: bytes | None = None,
+                     state_store: SQLiteStateStore | None = None, pdf_backend: str | None = None):
+    """
+    Regenerates one content slide of a finished job without re-running the
+    pipeline: re-prompts the LLM on just the source pages recorded in the
+    slide's provenance, re-fetches only that slide's visual, and patches the
+    deck in place. Pass `pptx_bytes` for jobs that were run in memory.
+    Returns the patched deck (bytes if `pptx_bytes` was given, else its path),
+    or None if the slide could not be regenerated. With `pdf_backend`, the
+    PDF next to the deck is rebuilt too (removed if that fails). The job must
+    have been run with `regenerable=True`: its state is read from
+    `state_store` (default: env STATE_DB) if it has it, else from the
+    workspace's final state file.
+    """
+    if state_store is None and os.getenv("STATE_DB"):
+        state_store = SQLiteStateStore(os.getenv("STATE_DB"))
+    sm = StateManager(workspace, backend=state_store)
+    restored = sm.restore()
+    if not restored:
+        try:
+            sm.load(FINAL_STATE_FILE)
+        except OSError:
+            print(f"ERROR: Job {workspace.job_id} kept no final state; it was not run with regenerable=True.")
+            return None
+    if pptx_bytes is not None:
+        sm.set_artifact("pptx", pptx_bytes)
+
+    provenance = (sm.get("provenance") or {}).get(slide_id)
+    if not provenance or "topic_index" not in provenance:
+        print(f"ERROR: Slide '{slide_id}' has no topic provenance; only content slides can be regenerated.")
+        return None
+
+    topic = ContentAgent("ContentAgent", sm).regenerate_topic(provenance["chapter_index"], provenance["topic_index"])
+    if not topic:
+        return None
+    slide = FormatAgent.content_slide(slide_id, topic)
+    slide = ExternalMediaAgent("MediaAgent", sm).attach_visual(slide)
+    if not PresentationAgent("PresentationAgent", sm).patch_slide(slide):
+        return None
+
+    if not restored:
+        sm.save(FINAL_STATE_FILE)
+    if pptx_bytes is not None:
+        return sm.get_artifact("pptx")
+    pptx_path = sm.get("output_path")
+    if pdf_backend:
+        stale_pdf = os.path.splitext(pptx_path)[0] + ".pdf"
+        if os.path.exists(stale_pdf):
+            os.remove(stale_pdf)
+        pdf_next_to(sm, pptx_path, pdf_backend)
+    return pptx_path
 
 # Update the main execution block if needed
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+# models.py
+# Typed chapter, topic and slide records passed between the agents.
+
+
+def _text(value, default: str = "") -> str:
+    if value is None:
+        return default
+    if isinstance(value, dict):
+        # Quiz questions sometimes come back as {"question": ..., "options": ...}
+        value = value.get("question") or value.get("text") or ""
+    return str(value).strip() or default
+
+
+def _texts(values) -> list[str]:
+    if values is None:
+        return []
+    if isinstance(values, (str, dict)):
+        values = [values]
+    if not isinstance(values, (list, tuple)):
+        raise ValueError(f"expected a list, got {type(values).__name__}")
+    return [text for text in map(_text, values) if text]
+
+
+def _optional(value) -> str | None:
+    return _text(value) or None
+
+
+class _Record:
+    """
+    Shared behaviour of the records below. Instances are treated as
+    immutable once they are in the shared state (StateManager is
+    copy-on-write); derive changed copies with `replace()`.
+    """
+
+    __slots__ = ()
+    # Fields left out of to_dict() while they are empty, to keep snapshots small
+    _OPTIONAL = ()
+
+    def replace(self, **changes):
+        record = object.__new__(type(self))
+        for name in self.__slots__:
+            setattr(record, name, changes.pop(name) if name in changes else getattr(self, name))
+        if changes:
+            raise TypeError(f"{type(self).__name__} has no field(s) {', '.join(changes)}")
+        return record
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        for name in self._OPTIONAL:
+            if not data[name]:
+                del data[name]
+        return data
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+
+class Topic(_Record):
+    """One topic of a chapter, as extracted by the ContentAgent."""
+
+    __slots__ = ("id", "title", "summary", "key_points", "quiz_questions", "image_hint", "diagram_dot_code")
+    _OPTIONAL = ("image_hint", "diagram_dot_code")
+
+    def __init__(self, id: str, title: str = "Untitled Topic", summary: str = "", key_points=(),
+                 quiz_questions=(), image_hint: str | None = None, diagram_dot_code: str | None = None):
+        self.id = id
+        self.title = title
+        self.summary = summary
+        self.key_points = list(key_points)
+        self.quiz_questions = list(quiz_questions)  # question text only
+        self.image_hint = image_hint
+        self.diagram_dot_code = diagram_dot_code
+
+    @classmethod
+    def from_dict(cls, data: dict, default_id: str = "t") -> "Topic":
+        """Validates and normalizes a topic object from the LLM (raises ValueError if malformed)."""
+        if not isinstance(data, dict):
+            raise ValueError(f"topic must be an object, got {type(data).__name__}")
+        return cls(id=_text(data.get("id"), default_id),
+                   title=_text(data.get("title"), "Untitled Topic"),
+                   summary=_text(data.get("summary")),
+                   key_points=_texts(data.get("key_points")),
+                   quiz_questions=_texts(data.get("quiz_questions")),
+                   image_hint=_optional(data.get("image_hint")),
+                   diagram_dot_code=_optional(data.get("diagram_dot_code")))
+
+
+class Chapter(_Record):
+    """A chapter and its topics, plus where in the source PDF it was extracted from."""
+
+    __slots__ = ("id", "title", "description", "topics", "source")
+    _OPTIONAL = ("source",)
+
+    def __init__(self, id: str, title: str = "Untitled Chapter", description: str = "", topics=(),
+                 source: dict | None = None):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.topics = list(topics)
+        self.source = source or {}  # {"chunk_index": int, "pages": [first, last]}
+
+    def to_dict(self) -> dict:
+        data = super().to_dict()
+        data["topics"] = [topic.to_dict() for topic in self.topics]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict, default_id: str = "ch", source: dict | None = None) -> "Chapter":
+        """
+        Validates and normalizes a chapter object from the LLM (raises
+        ValueError if malformed). Topics that are not objects are dropped.
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"chapter must be an object, got {type(data).__name__}")
+        chapter_id = _text(data.get("id"), default_id)
+        topics = data.get("topics") or []
+        if not isinstance(topics, list):
+            raise ValueError(f"chapter '{chapter_id}' topics must be a list")
+        return cls(id=chapter_id,
+                   title=_text(data.get("title"), "Untitled Chapter"),
+                   description=_text(data.get("description")),
+                   topics=[Topic.from_dict(t, f"{chapter_id}_t{i + 1}") for i, t in enumerate(topics)
+                           if isinstance(t, dict)],
+                   source=source if source is not None else data.get("source"))
+
+
+class Slide(_Record):
+    """One entry of the slide plan. Bullets are always plain strings (quiz questions included)."""
+
+    __slots__ = ("id", "type", "title", "subtitle", "bullets", "image_hint", "diagram_dot_code", "image_path")
+    _OPTIONAL = ("subtitle", "bullets", "image_hint", "diagram_dot_code", "image_path")
+
+    def __init__(self, id: str, type: str = "content", title: str = "", subtitle: str = "", bullets=(),
+                 image_hint: str | None = None, diagram_dot_code: str | None = None,
+                 image_path: str | None = None):
+        self.id = id
+        self.type = type
+        self.title = title
+        self.subtitle = subtitle
+        self.bullets = list(bullets)
+        self.image_hint = image_hint
+        self.diagram_dot_code = diagram_dot_code
+        self.image_path = image_path
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Slide":
+        if not isinstance(data, dict):
+            raise ValueError(f"slide must be an object, got {type(data).__name__}")
+        return cls(id=_text(data.get("id")),
+                   type=_text(data.get("type"), "content"),
+                   title=_text(data.get("title")),
+                   subtitle=_text(data.get("subtitle")),
+                   bullets=_texts(data.get("bullets")),
+                   image_hint=_optional(data.get("image_hint")),
+                   diagram_dot_code=_optional(data.get("diagram_dot_code")),
+                   image_path=data.get("image_path") or None)
+
+
+# State keys holding lists of records, and the record type of their items
+STATE_MODELS = {"chapters": Chapter, "slides": Slide}
+
+
+def to_json(value):
+    """`default=` hook for json.dumps: records become plain dicts."""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    return str(value)
+
+
+def decode_state(state: dict) -> dict:
+    """Turns the record lists of a state loaded from JSON back into records."""
+    decoded = dict(state)
+    for key, model in STATE_MODELS.items():
+        if decoded.get(key):
+            decoded[key] = [item if isinstance(item, model) else model.from_dict(item) for item in decoded[key]]
+    return decoded
@@ -0,0 +1,302 @@
+# pdf_converter.py
+# LibreOffice PDF conversion: a pool of warm headless instances driven over UNO sockets,
+# and batched conversion of several decks at once.
+
+import atexit
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+try:
+    # Only importable from a Python that ships with (or is linked to) LibreOffice
+    import uno
+except ImportError:
+    uno = None
+
+PDF_FILTER = "impress_pdf_Export"
+
+
+def find_office_binary() -> str | None:
+    """Path of the LibreOffice executable ('soffice' or 'libreoffice'), if on PATH."""
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _props(**values):
+    props = []
+    for name, value in values.items():
+        prop = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+        prop.Name, prop.Value = name, value
+        props.append(prop)
+    return tuple(props)
+
+
+class _OfficeInstance:
+    """One headless soffice process with its own user profile, driven over a UNO socket."""
+
+    def __init__(self, binary: str, startup_timeout: float):
+        self.binary = binary
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.desktop = None
+        self.port = None
+        self.profile_dir = None
+
+    def start(self):
+        self.port = _free_port()
+        # Separate profiles, otherwise a second instance hands its work to the first and exits
+        self.profile_dir = tempfile.mkdtemp(prefix="lo_profile_")
+        self.process = subprocess.Popen(
+            [self.binary, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+             f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext",
+             f"-env:UserInstallation={Path(self.profile_dir).as_uri()}"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local_ctx)
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                ctx = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext")
+                self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+                return
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"LibreOffice did not start listening on port {self.port}.")
+                time.sleep(0.25)
+
+    def is_healthy(self) -> bool:
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getFrames()  # cheap round trip over the socket
+            return True
+        except Exception:
+            return False
+
+    def convert(self, pptx_path: str, pdf_path: str):
+        doc = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(pptx_path)), "_blank", 0, _props(Hidden=True))
+        if doc is None:
+            raise RuntimeError(f"LibreOffice could not open {pptx_path}.")
+        try:
+            doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)), _props(FilterName=PDF_FILTER))
+        finally:
+            doc.close(True)
+
+    def kill(self):
+        """Hard stop; used by the timeout watchdog, unblocks any UNO call in progress."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+
+    def stop(self):
+        if self.desktop is not None and self.process is not None and self.process.poll() is None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.desktop = None
+        self.process = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+class ConversionPool:
+    """
+    Keeps `size` LibreOffice instances warm, so a conversion costs only the
+    render time rather than a cold start. Conversions are queued and picked up
+    by one worker thread per instance. Each instance is health-checked before
+    every job and restarted if it crashed or hung; a job that exceeds
+    `timeout` seconds kills its instance and fails.
+    """
+
+    def __init__(self, size: int = 1, timeout: float = 60, startup_timeout: float = 30,
+                 binary: str | None = None):
+        self.size = size
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.binary = binary or find_office_binary()
+        self._queue: queue.Queue = queue.Queue()
+        self._workers: list[threading.Thread] = []
+        self._instances: list[_OfficeInstance] = []
+
+    @staticmethod
+    def is_available() -> bool:
+        """True if both the UNO bindings and a LibreOffice executable are present."""
+        return uno is not None and find_office_binary() is not None
+
+    def start(self):
+        if self._workers:
+            return
+        if uno is None or self.binary is None:
+            raise RuntimeError("ConversionPool needs LibreOffice on PATH and its Python UNO bindings.")
+        for i in range(self.size):
+            instance = _OfficeInstance(self.binary, self.startup_timeout)
+            worker = threading.Thread(target=self._work, args=(instance,), name=f"office-{i}", daemon=True)
+            self._instances.append(instance)
+            self._workers.append(worker)
+            worker.start()
+
+    def _work(self, instance: _OfficeInstance):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                instance.stop()
+                return
+            pptx_path, pdf_path, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            timed_out = threading.Event()
+
+            def on_timeout():
+                timed_out.set()
+                instance.kill()
+
+            try:
+                if not instance.is_healthy():
+                    instance.stop()
+                    instance.start()
+                watchdog = threading.Timer(self.timeout, on_timeout)
+                watchdog.start()
+                try:
+                    instance.convert(pptx_path, pdf_path)
+                finally:
+                    watchdog.cancel()
+                future.set_result(pdf_path)
+            except Exception as e:
+                if timed_out.is_set():
+                    e = TimeoutError(f"Conversion of {pptx_path} exceeded {self.timeout}s.")
+                # The next job's health check restarts the instance if this left it broken
+                future.set_exception(e)
+
+    def submit(self, pptx_path: str, pdf_path: str | None = None) -> Future:
+        """Queues a conversion; the future resolves to the PDF path."""
+        self.start()
+        future = Future()
+        self._queue.put((pptx_path, pdf_path or os.path.splitext(pptx_path)[0] + ".pdf", future))
+        return future
+
+    def convert(self, pptx_path: str, pdf_path: str | None = None) -> str | None:
+        """Converts one deck and waits for it. Returns the PDF path, or None on failure."""
+        try:
+            return self.submit(pptx_path, pdf_path).result()
+        except Exception as e:
+            print(f"Warm LibreOffice conversion of {os.path.basename(pptx_path)} failed: {e}")
+            return None
+
+    def shutdown(self):
+        """Stops the workers and their LibreOffice instances."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=30)
+        self._workers.clear()
+        self._instances.clear()
+
+
+def _cold_convert_batch(pptx_paths: list[str], timeout_per_deck: float) -> dict[str, str | None]:
+    """
+    Converts every deck with a single `soffice --convert-to pdf` invocation.
+    Decks are linked into a scratch directory under unique names (every job's
+    deck is called final_presentation.pptx), and each PDF is moved back next
+    to its source. Decks that produce no PDF map to None.
+    """
+    binary = find_office_binary()
+    results = {path: None for path in pptx_paths}
+    if binary is None or not pptx_paths:
+        return results
+    with tempfile.TemporaryDirectory(prefix="pdf_batch_") as scratch:
+        staged = {}
+        for i, path in enumerate(pptx_paths):
+            staged_path = os.path.join(scratch, f"deck{i}.pptx")
+            try:
+                os.link(path, staged_path)
+            except OSError:
+                shutil.copyfile(path, staged_path)
+            staged[path] = staged_path
+        try:
+            subprocess.run([binary, "--headless", "--convert-to", "pdf", "--outdir", scratch, *staged.values()],
+                           check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                           timeout=timeout_per_deck * len(pptx_paths))
+        except subprocess.TimeoutExpired:
+            print(f"Batch conversion of {len(pptx_paths)} decks timed out; keeping the PDFs already written.")
+        for path, staged_path in staged.items():
+            staged_pdf = os.path.splitext(staged_path)[0] + ".pdf"
+            if os.path.exists(staged_pdf) and os.path.getsize(staged_pdf) > 0:
+                pdf_path = os.path.splitext(path)[0] + ".pdf"
+                shutil.move(staged_pdf, pdf_path)
+                results[path] = pdf_path
+    return results
+
+
+def convert_batch(pptx_paths: list[str], timeout_per_deck: float = 60) -> dict[str, str | None]:
+    """
+    Converts several decks in one go, writing each PDF next to its .pptx.
+    Returns {pptx_path: pdf_path or None}; a deck that fails never fails the
+    others. Uses the warm pool when available, otherwise one cold LibreOffice
+    invocation for the whole batch, then retries any deck it missed on its own
+    (so one bad deck that crashes the batch run only costs a retry).
+    """
+    pool = get_conversion_pool()
+    if pool is not None:
+        futures = {path: pool.submit(path) for path in pptx_paths}
+        results = {}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                print(f"Conversion of {path} failed: {e}")
+                results[path] = None
+        return results
+
+    if find_office_binary() is None:
+        return {path: None for path in pptx_paths}
+    results = _cold_convert_batch(pptx_paths, timeout_per_deck)
+    missed = [path for path, pdf_path in results.items() if pdf_path is None]
+    # A deck that crashes soffice can take the whole batch down with it
+    if len(pptx_paths) > 1:
+        for path in missed:
+            results.update(_cold_convert_batch([path], timeout_per_deck))
+    return results
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_conversion_pool() -> ConversionPool | None:
+    """
+    Returns the process-wide ConversionPool (size from env OFFICE_POOL_SIZE,
+    default 1), or None if warm conversion is unavailable or disabled with
+    OFFICE_POOL_SIZE=0.
+    """
+    global _pool
+    size = int(os.getenv("OFFICE_POOL_SIZE", "1"))
+    if size < 1 or not ConversionPool.is_available():
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConversionPool(size=size)
+            atexit.register(_pool.shutdown)
+        return _pool
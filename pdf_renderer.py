@@ -0,0 +1,221 @@
+# pdf_renderer.py
+# Draws a slide plan straight into a PDF with PyMuPDF, without going through LibreOffice.
+
+import os
+import re
+from functools import lru_cache
+import fitz
+from lxml import etree
+from template_cache import get_template_cache
+from layout_index import slide_kind
+from models import Slide
+from text_fit import EMU_PER_POINT, LINE_HEIGHT, TextStyle, find_font_file, placeholder_text_style, theme_element, theme_font
+
+_NS = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+       "p": "http://schemas.openxmlformats.org/presentationml/2006/main"}
+SYSTEM_COLORS = {"windowText": "000000", "window": "FFFFFF"}
+BULLET = "• "
+# Text that does not fit is shrunk in steps down to this fraction of its style size
+MIN_FONT_SCALE = 0.5
+
+
+def _xpath(element, expr):
+    return etree.XPath(expr, namespaces=_NS)(element)
+
+
+def _rgb(hex_value: str) -> tuple[float, float, float]:
+    return tuple(int(hex_value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def _rect(box) -> fitz.Rect:
+    left, top, width, height = (v / EMU_PER_POINT for v in box)
+    return fitz.Rect(left, top, left + width, top + height)
+
+
+class RenderTheme:
+    """What the renderer needs from a template: page size, colors, fonts and placeholder regions."""
+
+    __slots__ = ("width", "height", "background", "text_color", "title_color",
+                 "body_font", "title_font", "regions")
+
+    def __init__(self, width, height, background, text_color, title_color, body_font, title_font, regions):
+        self.width = width
+        self.height = height
+        self.background = background
+        self.text_color = text_color
+        self.title_color = title_color
+        self.body_font = body_font      # font file path, or None for Helvetica
+        self.title_font = title_font
+        self.regions = regions          # slide kind -> {role: (fitz.Rect, TextStyle | None)}
+
+
+def _scheme_colors(prs) -> dict[str, tuple]:
+    """Theme color slots (dk1, accent1, ...) plus the master's clrMap aliases (tx1, bg1, ...)."""
+    colors = {}
+    theme = theme_element(prs)
+    if theme is not None:
+        for slot in _xpath(theme, ".//a:clrScheme/*"):
+            if len(slot):
+                value = slot[0].get("lastClr") or SYSTEM_COLORS.get(slot[0].get("val")) or slot[0].get("val")
+                colors[etree.QName(slot).localname] = _rgb(value)
+    for clr_map in _xpath(prs.slide_master._element, "./p:clrMap"):
+        for alias, slot in clr_map.attrib.items():
+            if slot in colors:
+                colors[alias] = colors[slot]
+    return colors
+
+
+def _color(elements, colors, default):
+    """First srgbClr/schemeClr found under `elements`, resolved to RGB."""
+    for element in elements:
+        for srgb in _xpath(element, ".//a:srgbClr/@val"):
+            return _rgb(srgb)
+        for scheme in _xpath(element, ".//a:schemeClr/@val"):
+            if scheme in colors:
+                return colors[scheme]
+    return default
+
+
+def build_render_theme(template_path: str | None) -> RenderTheme:
+    cache = get_template_cache()
+    prs = cache.load(template_path)
+    layouts = cache.layout_index(template_path)
+    master = prs.slide_master
+    colors = _scheme_colors(prs)
+    text_color = colors.get("tx1", (0, 0, 0))
+    # Solid backgrounds and bgRef fills are approximated by their base color
+    background = _color(_xpath(master._element, "./p:cSld/p:bg"), colors, colors.get("bg1", (1, 1, 1)))
+    title_color = _color(_xpath(master._element, "./p:txStyles/p:titleStyle/a:lvl1pPr/a:defRPr"), colors, text_color)
+
+    regions = {}
+    for kind, spec in layouts.items():
+        placeholders = {ph.placeholder_format.idx: ph for ph in prs.slide_layouts[spec.layout_position].placeholders}
+        roles = {}
+        for role, idx, master_style in (("title", spec.title_idx, "titleStyle"),
+                                        ("subtitle", spec.subtitle_idx, "bodyStyle"),
+                                        ("body", spec.body_idx, "bodyStyle")):
+            ph = placeholders.get(idx) if idx is not None else None
+            if ph is not None:
+                box = (ph.left or 0, ph.top or 0, ph.width or 0, ph.height or 0)
+                roles[role] = (_rect(box), placeholder_text_style(ph, master, master_style))
+        if spec.image_box:
+            roles["image"] = (_rect(spec.image_box), None)
+        regions[kind] = roles
+
+    body_family, title_family = theme_font(prs), theme_font(prs, "majorFont")
+    return RenderTheme(
+        width=prs.slide_width / EMU_PER_POINT, height=prs.slide_height / EMU_PER_POINT,
+        background=background, text_color=text_color, title_color=title_color,
+        body_font=find_font_file(body_family) if body_family else None,
+        title_font=find_font_file(title_family) if title_family else None,
+        regions=regions)
+
+
+@lru_cache(maxsize=16)
+def _cached_theme(template_path: str | None, mtime: float | None) -> RenderTheme:
+    return build_render_theme(template_path)
+
+
+def render_theme(template_path: str | None = None) -> RenderTheme:
+    """RenderTheme for a template, built once per template file version."""
+    key = os.path.abspath(template_path) if template_path else None
+    return _cached_theme(key, os.path.getmtime(key) if key else None)
+
+
+class _TextPainter:
+    """Fits text into a region (shrinking it if needed) and honors the placeholder's vertical anchor."""
+
+    # The scratch page is replaced after this many layouts, so its content stream stays small
+    SCRATCH_USES = 50
+
+    def __init__(self, width: float, height: float):
+        # Text is laid out on a scratch page first to learn how much height it takes
+        self._scratch_doc = fitz.open()
+        self._size = (width, height)
+        self._scratch = None
+        self._uses = 0
+
+    def _scratch_page(self):
+        if self._scratch is None or self._uses >= self.SCRATCH_USES:
+            if self._scratch is not None:
+                self._scratch_doc.delete_page(0)
+            self._scratch = self._scratch_doc.new_page(width=self._size[0], height=self._size[1])
+            self._uses = 0
+        self._uses += 1
+        return self._scratch
+
+    @staticmethod
+    def _insert(page, rect, text, size, font_file, color, style, align):
+        font_args = {"fontname": "helv"}
+        if font_file:
+            font_args = {"fontname": re.sub(r"\W", "", os.path.splitext(os.path.basename(font_file))[0]),
+                         "fontfile": font_file}
+        return page.insert_textbox(rect, text, fontsize=size, color=color, align=align,
+                                   lineheight=LINE_HEIGHT * style.line_spacing, **font_args)
+
+    def draw(self, page, rect, text, style: TextStyle, font_file, color, align=fitz.TEXT_ALIGN_LEFT):
+        if not text:
+            return
+        left, top, right, bottom = (v / EMU_PER_POINT for v in style.insets)
+        rect = fitz.Rect(rect.x0 + left, rect.y0 + top, rect.x1 - right, rect.y1 - bottom)
+
+        size = style.size_pt
+        while True:
+            spare = self._insert(self._scratch_page(), rect, text, size, font_file, color, style, align)
+            if spare >= 0 or size <= style.size_pt * MIN_FONT_SCALE:
+                break
+            size *= 0.9
+        spare = max(spare, 0)
+        offset = {"ctr": spare / 2, "b": spare}.get(style.anchor, 0)
+        self._insert(page, fitz.Rect(rect.x0, rect.y0 + offset, rect.x1, rect.y1), text, size,
+                     font_file, color, style, align)
+
+
+def render_document(slides_plan: list[Slide], template_path: str | None = None, image_optimizer=None) -> fitz.Document:
+    """
+    Draws `slides_plan` (already paginated, see PresentationAgent.paginate),
+    one page per slide, using the template's page size, background, theme
+    colors and fonts, and placeholder geometry. Returns the open document.
+    """
+    theme = render_theme(template_path)
+    painter = _TextPainter(theme.width, theme.height)
+    doc = fitz.open()
+    for slide_data in slides_plan:
+        page = doc.new_page(width=theme.width, height=theme.height)
+        page.draw_rect(page.rect, color=None, fill=theme.background)
+
+        image_path = slide_data.image_path
+        has_image = bool(image_path and os.path.exists(image_path))
+        kind = slide_kind(slide_data.type, has_image)
+        roles = theme.regions.get(kind, {})
+        centered = fitz.TEXT_ALIGN_CENTER if kind in ("title", "title_only") else fitz.TEXT_ALIGN_LEFT
+
+        if "title" in roles:
+            rect, style = roles["title"]
+            painter.draw(page, rect, slide_data.title, style, theme.title_font, theme.title_color, centered)
+        if kind == "title" and "subtitle" in roles:
+            rect, style = roles["subtitle"]
+            painter.draw(page, rect, slide_data.subtitle, style, theme.body_font, theme.text_color, centered)
+        if kind in ("content", "content_with_image") and "body" in roles:
+            rect, style = roles["body"]
+            painter.draw(page, rect, "\n".join(BULLET + b for b in slide_data.bullets), style,
+                         theme.body_font, theme.text_color)
+        if kind == "content_with_image" and "image" in roles:
+            rect, _ = roles["image"]
+            if image_optimizer:
+                try:
+                    image_path = image_optimizer.optimize(image_path, round(rect.width * EMU_PER_POINT),
+                                                          round(rect.height * EMU_PER_POINT))
+                except Exception:
+                    pass
+            page.insert_image(rect, filename=image_path, keep_proportion=True)
+
+    return doc
+
+
+def render_pdf(slides_plan: list[Slide], template_path: str | None = None, image_optimizer=None) -> bytes:
+    """Renders `slides_plan` (see render_document) and returns the PDF bytes."""
+    doc = render_document(slides_plan, template_path, image_optimizer)
+    # Embed only the glyphs actually used
+    doc.subset_fonts()
+    return doc.tobytes(garbage=3, deflate=True)
@@ -0,0 +1,293 @@
+# pptx_package.py
+# Zip-level .pptx assembly: a slide-free template package plus individually added slide parts.
+
+import hashlib
+import posixpath
+import zipfile
+from io import BytesIO
+from lxml import etree
+
+NS_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_CT = "http://schemas.openxmlformats.org/package/2006/content-types"
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+RT_SLIDE = NS_R + "/slide"
+RT_IMAGE = NS_R + "/image"
+RT_SLIDE_LAYOUT = NS_R + "/slideLayout"
+RT_NOTES_SLIDE = NS_R + "/notesSlide"
+
+CT_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+IMAGE_CONTENT_TYPES = {
+    "png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "gif": "image/gif",
+    "bmp": "image/bmp", "tif": "image/tiff", "tiff": "image/tiff",
+    "wmf": "image/x-wmf", "emf": "image/x-emf", "svg": "image/svg+xml",
+}
+
+PRESENTATION_XML = "ppt/presentation.xml"
+PRESENTATION_RELS = "ppt/_rels/presentation.xml.rels"
+CONTENT_TYPES = "[Content_Types].xml"
+FIRST_SLIDE_ID = 256
+
+
+def rels_name(part_name: str) -> str:
+    """Zip name of the .rels file belonging to `part_name` (e.g. ppt/slides/_rels/slide1.xml.rels)."""
+    directory, filename = posixpath.split(part_name)
+    return posixpath.join(directory, "_rels", filename + ".rels")
+
+
+def resolve_target(part_name: str, target: str) -> str:
+    """Zip name of a relationship target given relative to `part_name`."""
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part_name), target))
+
+
+def read_relationships(rels_xml: bytes) -> list[tuple[str, str, str, bool]]:
+    """Parses a .rels part into (rId, reltype, target, is_external) tuples."""
+    root = etree.fromstring(rels_xml)
+    return [
+        (rel.get("Id"), rel.get("Type"), rel.get("Target"), rel.get("TargetMode") == "External")
+        for rel in root.iter(f"{{{NS_REL}}}Relationship")
+    ]
+
+
+def serialize_relationships(relationships: list[tuple[str, str, str, bool]]) -> bytes:
+    root = etree.Element(f"{{{NS_REL}}}Relationships", nsmap={None: NS_REL})
+    for rId, reltype, target, is_external in relationships:
+        rel = etree.SubElement(root, f"{{{NS_REL}}}Relationship", Id=rId, Type=reltype, Target=target)
+        if is_external:
+            rel.set("TargetMode", "External")
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+def slide_names(zf: zipfile.ZipFile) -> list[str]:
+    """Zip names of a package's slide parts, in presentation order."""
+    rels = {rId: target for rId, _, target, _ in read_relationships(zf.read(PRESENTATION_RELS))}
+    root = etree.fromstring(zf.read(PRESENTATION_XML))
+    return [
+        resolve_target(PRESENTATION_XML, rels[sld_id.get(f"{{{NS_R}}}id")])
+        for sld_id in root.iter(f"{{{NS_P}}}sldId")
+    ]
+
+
+def _add_media_defaults(content_types_root, media_names):
+    """Adds a Default content type for each media extension the package does not declare yet."""
+    defaults = {d.get("Extension").lower() for d in content_types_root.iter(f"{{{NS_CT}}}Default")}
+    for media_name in media_names:
+        ext = posixpath.splitext(media_name)[1].lstrip(".")
+        if ext not in defaults:
+            content_type = IMAGE_CONTENT_TYPES.get(ext, f"image/{ext}")
+            content_types_root.insert(0, etree.Element(f"{{{NS_CT}}}Default", Extension=ext, ContentType=content_type))
+            defaults.add(ext)
+
+
+class PptxAssembler:
+    """
+    Writes a .pptx by adding slide parts one at a time directly into the output
+    zip. Only the template's package-level parts (presentation.xml, its rels
+    and the content types) are held and patched when the package is closed;
+    images are deduplicated by content hash across all slides.
+
+    `template_blob` must be a slide-free package (see TemplateCache) whose
+    layouts are the ones the added slides point at.
+    """
+
+    def __init__(self, template_blob: bytes, output):
+        self._template = zipfile.ZipFile(BytesIO(template_blob))
+        self._template_names = set(self._template.namelist())
+        self._out = zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED)
+        self._slides: list[str] = []
+        self._media: dict[str, str] = {}  # sha1 -> zip name
+        self._media_count = 0
+
+    def _add_media(self, blob: bytes, ext: str) -> str:
+        digest = hashlib.sha1(blob).hexdigest()
+        name = self._media.get(digest)
+        if name is None:
+            while True:
+                self._media_count += 1
+                name = f"ppt/media/image{self._media_count}.{ext}"
+                if name not in self._template_names:
+                    break
+            self._out.writestr(name, blob)
+            self._media[digest] = name
+        return name
+
+    def add_slide(self, slide_xml: bytes, relationships: list[tuple[str, str, str, bool]], read_target):
+        """
+        Adds one slide. `relationships` are the slide's own (rId, reltype,
+        target, is_external) tuples; `read_target(target)` must return the
+        bytes of an internal target (only called for images). rIds inside the
+        slide XML are kept, only image targets are rewritten.
+        """
+        name = f"ppt/slides/slide{len(self._slides) + 1}.xml"
+        rewritten = []
+        for rId, reltype, target, is_external in relationships:
+            if is_external or reltype == RT_SLIDE_LAYOUT:
+                rewritten.append((rId, reltype, target, is_external))
+            elif reltype == RT_IMAGE:
+                ext = posixpath.splitext(target)[1].lstrip(".").lower() or "png"
+                media_name = self._add_media(read_target(target), ext)
+                rewritten.append((rId, reltype, posixpath.relpath(media_name, "ppt/slides"), False))
+            elif reltype == RT_NOTES_SLIDE:
+                continue
+            else:
+                raise ValueError(f"Unsupported slide relationship type '{reltype}'")
+        self._out.writestr(name, slide_xml)
+        self._out.writestr(rels_name(name), serialize_relationships(rewritten))
+        self._slides.append(name)
+
+    def add_package(self, pptx_bytes: bytes):
+        """Appends every slide of another package built from the same template."""
+        with zipfile.ZipFile(BytesIO(pptx_bytes)) as zf:
+            names = set(zf.namelist())
+            for name in slide_names(zf):
+                rels = rels_name(name)
+                relationships = read_relationships(zf.read(rels)) if rels in names else []
+                self.add_slide(zf.read(name), relationships,
+                               lambda target, name=name: zf.read(resolve_target(name, target)))
+
+    def _patched_presentation(self) -> tuple[bytes, bytes]:
+        rels = read_relationships(self._template.read(PRESENTATION_RELS))
+        used = {rId for rId, *_ in rels}
+        next_id = 1
+        slide_rIds = []
+        for name in self._slides:
+            while f"rId{next_id}" in used:
+                next_id += 1
+            rId = f"rId{next_id}"
+            used.add(rId)
+            rels.append((rId, RT_SLIDE, posixpath.relpath(name, "ppt"), False))
+            slide_rIds.append(rId)
+
+        root = etree.fromstring(self._template.read(PRESENTATION_XML))
+        sld_id_lst = root.find(f"{{{NS_P}}}sldIdLst")
+        if sld_id_lst is None:
+            sld_id_lst = etree.Element(f"{{{NS_P}}}sldIdLst")
+            # sldIdLst follows the master lists in the schema sequence
+            anchor = None
+            for tag in ("sldMasterIdLst", "notesMasterIdLst", "handoutMasterIdLst"):
+                found = root.find(f"{{{NS_P}}}{tag}")
+                if found is not None:
+                    anchor = found
+            if anchor is not None:
+                anchor.addnext(sld_id_lst)
+            else:
+                root.insert(0, sld_id_lst)
+        for child in list(sld_id_lst):
+            sld_id_lst.remove(child)
+        for i, rId in enumerate(slide_rIds):
+            etree.SubElement(sld_id_lst, f"{{{NS_P}}}sldId", {"id": str(FIRST_SLIDE_ID + i), f"{{{NS_R}}}id": rId})
+
+        presentation_xml = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+        return presentation_xml, serialize_relationships(rels)
+
+    def _patched_content_types(self) -> bytes:
+        root = etree.fromstring(self._template.read(CONTENT_TYPES))
+        _add_media_defaults(root, self._media.values())
+        for name in self._slides:
+            etree.SubElement(root, f"{{{NS_CT}}}Override", PartName="/" + name, ContentType=CT_SLIDE)
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    def close(self):
+        """Writes the template's package parts (patched to list the added slides) and closes the zip."""
+        presentation_xml, presentation_rels = self._patched_presentation()
+        patched = {
+            PRESENTATION_XML: presentation_xml,
+            PRESENTATION_RELS: presentation_rels,
+            CONTENT_TYPES: self._patched_content_types(),
+        }
+        for info in self._template.infolist():
+            self._out.writestr(info.filename, patched.get(info.filename) or self._template.read(info.filename),
+                               compress_type=zipfile.ZIP_DEFLATED)
+        self._out.close()
+        self._template.close()
+
+
+def merge_packages(template_blob: bytes, parts: list[bytes]) -> bytes:
+    """Concatenates the slides of several decks built from the same template into one .pptx."""
+    buffer = BytesIO()
+    assembler = PptxAssembler(template_blob, buffer)
+    for part in parts:
+        assembler.add_package(part)
+    assembler.close()
+    return buffer.getvalue()
+
+
+def replace_slide(pptx_bytes: bytes, position: int, slide_xml: bytes,
+                  relationships: list[tuple[str, str, str, bool]], read_target) -> bytes:
+    """
+    Returns a copy of the package with the slide at `position` (0-based)
+    replaced by `slide_xml`. Images identical to media already in the
+    package are reused, others are stored as new media parts, and media no
+    longer referenced by any part is dropped. Every other part keeps its
+    exact content.
+    """
+    with zipfile.ZipFile(BytesIO(pptx_bytes)) as zf:
+        names = zf.namelist()
+        name_set = set(names)
+        slide_name = slide_names(zf)[position]
+        slide_rels = rels_name(slide_name)
+
+        old_relationships = read_relationships(zf.read(slide_rels)) if slide_rels in name_set else []
+        old_media = {resolve_target(slide_name, target) for _, reltype, target, is_external in old_relationships
+                     if reltype == RT_IMAGE and not is_external}
+        # Media still used by some other part must be kept
+        referenced_elsewhere = set()
+        for name in names:
+            if name.endswith(".rels") and name != slide_rels:
+                source = posixpath.join(posixpath.dirname(posixpath.dirname(name)),
+                                        posixpath.basename(name)[:-len(".rels")])
+                for _, _, target, is_external in read_relationships(zf.read(name)):
+                    if not is_external:
+                        referenced_elsewhere.add(resolve_target(source, target))
+        # Existing media by size: only same-sized parts need to be read and compared
+        media_by_size: dict[int, list[str]] = {}
+        for info in zf.infolist():
+            if info.filename.startswith("ppt/media/"):
+                media_by_size.setdefault(info.file_size, []).append(info.filename)
+
+        def find_existing(blob):
+            for name in media_by_size.get(len(blob), []):
+                if name in old_media or name in referenced_elsewhere:
+                    if zf.read(name) == blob:
+                        return name
+            return None
+
+        new_media: dict[str, bytes] = {}
+        kept_media = set()
+        rewritten = []
+        counter = 0
+        for rId, reltype, target, is_external in relationships:
+            if is_external or reltype != RT_IMAGE:
+                if reltype != RT_NOTES_SLIDE:
+                    rewritten.append((rId, reltype, target, is_external))
+                continue
+            blob = read_target(target)
+            media_name = find_existing(blob)
+            if media_name is None:
+                ext = posixpath.splitext(target)[1].lstrip(".").lower() or "png"
+                while media_name is None or media_name in name_set or media_name in new_media:
+                    counter += 1
+                    media_name = f"ppt/media/patched_image{counter}.{ext}"
+                new_media[media_name] = blob
+            kept_media.add(media_name)
+            rewritten.append((rId, reltype, posixpath.relpath(media_name, posixpath.dirname(slide_name)), False))
+        dropped = old_media - kept_media - referenced_elsewhere
+
+        replacements = {slide_name: slide_xml, slide_rels: serialize_relationships(rewritten)}
+        if new_media:
+            root = etree.fromstring(zf.read(CONTENT_TYPES))
+            _add_media_defaults(root, new_media)
+            replacements[CONTENT_TYPES] = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as out:
+            for info in zf.infolist():
+                if info.filename in dropped or info.filename == slide_rels:
+                    continue
+                data = replacements.get(info.filename)
+                out.writestr(info, data if data is not None else zf.read(info.filename))
+            out.writestr(slide_rels, replacements[slide_rels])
+            for media_name, blob in new_media.items():
+                out.writestr(media_name, blob)
+    return buffer.getvalue()
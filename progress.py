@@ -0,0 +1,191 @@
+# progress.py
+# Structured progress events for a pipeline run, with ETA, partial artifacts and process-wide metrics.
+
+import threading
+import time
+from typing import Any, Callable
+
+# Pipeline stages in order, with their default share of a run's time (used
+# for the overall fraction and ETA until PipelineMetrics has real durations)
+STAGES = ("content", "format", "design", "media", "presentation", "pdf")
+DEFAULT_STAGE_WEIGHTS = {"content": 0.6, "format": 0.01, "design": 0.01, "media": 0.2,
+                         "presentation": 0.1, "pdf": 0.08}
+
+# Event kinds
+STAGE_START, PROGRESS, STAGE_END, ARTIFACT, DONE, FAILED = (
+    "stage_start", "progress", "stage_end", "artifact", "done", "failed")
+
+
+class ProgressEvent:
+    """One entry of a job's progress stream."""
+
+    __slots__ = ("job_id", "kind", "stage", "message", "current", "total", "unit", "bytes", "fraction",
+                 "eta", "duration", "resumed", "artifact_kind", "artifact", "timestamp")
+
+    def __init__(self, job_id: str, kind: str, stage: str | None, message: str | None = None,
+                 current: int | None = None, total: int | None = None, unit: str | None = None,
+                 bytes: int | None = None, fraction: float = 0.0, eta: float | None = None,
+                 duration: float | None = None, resumed: bool = False, artifact_kind: str | None = None,
+                 artifact: Any = None):
+        self.job_id = job_id
+        self.kind = kind
+        self.stage = stage
+        self.message = message
+        self.current = current      # e.g. chunk 3 of `total`, in `unit`s ("chunk", "slide")
+        self.total = total
+        self.unit = unit
+        self.bytes = bytes          # bytes downloaded so far in this stage
+        self.fraction = fraction    # overall completion, 0..1
+        self.eta = eta              # estimated seconds left, once there is enough to go on
+        self.duration = duration    # seconds the stage took (stage_end)
+        self.resumed = resumed      # stage restored from a checkpoint (stage_end)
+        self.artifact_kind = artifact_kind  # e.g. "outline", "slides", "previews"
+        self.artifact = artifact
+        self.timestamp = time.time()
+
+    def to_dict(self, with_artifact: bool = True) -> dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        if not with_artifact:
+            data.pop("artifact")
+        return data
+
+
+class ProgressTracker:
+    """
+    Builds a job's progress stream: agents report steps within the current
+    stage, and every listener receives the resulting ProgressEvents (with the
+    overall fraction and ETA filled in). Step events are throttled to one per
+    `min_interval` seconds; stage, artifact and final events always go out.
+    A listener that raises is reported and otherwise ignored.
+    """
+
+    def __init__(self, job_id: str, weights: dict[str, float] | None = None, min_interval: float = 0.25):
+        self.job_id = job_id
+        self.weights = weights or DEFAULT_STAGE_WEIGHTS
+        self.min_interval = min_interval
+        self._listeners: list[Callable[[ProgressEvent], None]] = []
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._finished: set[str] = set()
+        self._stage = None
+        self._stage_started_at = None
+        self._stage_fraction = 0.0
+        self._bytes = 0
+        self._last_step = 0.0
+
+    def subscribe(self, listener: Callable[[ProgressEvent], None]) -> Callable[[], None]:
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    @property
+    def stage(self) -> str | None:
+        return self._stage
+
+    def fraction(self) -> float:
+        total = sum(self.weights.get(stage, 0) for stage in STAGES) or 1
+        done = sum(self.weights.get(stage, 0) for stage in self._finished)
+        if self._stage and self._stage not in self._finished:
+            done += self.weights.get(self._stage, 0) * self._stage_fraction
+        return min(done / total, 1.0)
+
+    def _emit(self, kind: str, **fields):
+        fraction = fields.pop("fraction", None)
+        if fraction is None:
+            fraction = self.fraction()
+        elapsed = time.time() - self._started_at
+        eta = elapsed * (1 - fraction) / fraction if 0.02 < fraction < 1 else (0.0 if fraction >= 1 else None)
+        event = ProgressEvent(self.job_id, kind, fields.pop("stage", self._stage), fraction=fraction, eta=eta,
+                              **fields)
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"WARNING: Progress listener failed: {e}")
+        return event
+
+    def start_stage(self, stage: str, message: str | None = None):
+        with self._lock:
+            self._stage, self._stage_started_at = stage, time.time()
+            self._stage_fraction, self._bytes = 0.0, 0
+        self._emit(STAGE_START, message=message)
+
+    def step(self, current: int, total: int, message: str | None = None, unit: str | None = None,
+             bytes: int = 0, artifact_kind: str | None = None, artifact: Any = None):
+        """Reports `current` of `total` units done in the current stage (and `bytes` more downloaded)."""
+        with self._lock:
+            self._stage_fraction = min(current / total, 1.0) if total else 0.0
+            self._bytes += bytes
+            now = time.time()
+            if current < total and now - self._last_step < self.min_interval and artifact is None:
+                return
+            self._last_step = now
+        self._emit(PROGRESS, message=message, current=current, total=total, unit=unit,
+                   bytes=self._bytes or None, artifact_kind=artifact_kind, artifact=artifact)
+
+    def note(self, message: str):
+        """Passes on a message within the current stage without changing its progress."""
+        self._emit(PROGRESS, message=message)
+
+    def end_stage(self, resumed: bool = False):
+        with self._lock:
+            stage, started_at = self._stage, self._stage_started_at
+            self._finished.add(stage)
+        self._emit(STAGE_END, stage=stage, duration=time.time() - started_at, resumed=resumed,
+                   bytes=self._bytes or None)
+
+    def artifact(self, kind: str, data: Any, message: str | None = None):
+        """Publishes a partial result, e.g. the outline as soon as the content is known."""
+        self._emit(ARTIFACT, message=message, artifact_kind=kind, artifact=data)
+
+    def finish(self, ok: bool = True, message: str | None = None):
+        self._emit(DONE if ok else FAILED, message=message, fraction=1.0 if ok else self.fraction(),
+                   duration=time.time() - self._started_at)
+
+
+class PipelineMetrics:
+    """
+    Process-wide aggregates fed from every job's progress stream: stage
+    durations (count / total / max), finished and failed jobs, and units and
+    bytes processed. Its mean stage durations also weight new trackers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: dict[str, dict[str, float]] = {}
+        self.counters: dict[str, float] = {"jobs_done": 0, "jobs_failed": 0, "bytes_downloaded": 0}
+
+    def record(self, event: ProgressEvent):
+        with self._lock:
+            if event.kind == STAGE_END and not event.resumed:
+                stats = self.stages.setdefault(event.stage, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                stats["count"] += 1
+                stats["total_seconds"] += event.duration
+                stats["max_seconds"] = max(stats["max_seconds"], event.duration)
+                self.counters["bytes_downloaded"] += event.bytes or 0
+            elif event.kind == PROGRESS and event.unit and event.current == event.total:
+                key = f"{event.unit}s_processed"
+                self.counters[key] = self.counters.get(key, 0) + event.total
+            elif event.kind == DONE:
+                self.counters["jobs_done"] += 1
+            elif event.kind == FAILED:
+                self.counters["jobs_failed"] += 1
+
+    def stage_weights(self) -> dict[str, float] | None:
+        """Mean seconds per stage, once every stage has been timed at least once."""
+        with self._lock:
+            if not all(self.stages.get(stage, {}).get("count") for stage in STAGES):
+                return None
+            return {stage: self.stages[stage]["total_seconds"] / self.stages[stage]["count"] for stage in STAGES}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"stages": {stage: dict(stats) for stage, stats in self.stages.items()},
+                    "counters": dict(self.counters)}
+
+
+_metrics = PipelineMetrics()
+
+
+def get_metrics() -> PipelineMetrics:
+    """Returns the process-wide PipelineMetrics."""
+    return _metrics
@@ -0,0 +1,165 @@
+# result_cache.py
+# Disk cache of finished decks, keyed by the source PDF's hash and the generation options.
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+META_FILE = "meta.json"
+PPTX_FILE = "final_presentation.pptx"
+PDF_FILE = "final_presentation.pdf"
+
+
+class ResultCache:
+    """
+    Stores the .pptx (and .pdf) of finished jobs under a key derived from
+    everything that determines them, so an identical request is answered
+    without running the pipeline. Each entry is a directory, written under a
+    temp name and renamed into place. The total size is kept under
+    `max_bytes` by evicting the least recently used entries.
+    """
+
+    def __init__(self, root: str = os.path.join(".cache", "results"), max_bytes: int = 1 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(options: dict) -> str:
+        """Cache key for a JSON-serializable dict of everything the result depends on."""
+        payload = json.dumps(options, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> tuple[str, str | None] | None:
+        """(pptx_path, pdf_path or None) of a cached result, or None on a miss."""
+        entry = self._entry(key)
+        pptx_path, pdf_path = os.path.join(entry, PPTX_FILE), os.path.join(entry, PDF_FILE)
+        if not os.path.exists(pptx_path):
+            return None
+        try:
+            # The meta file's mtime is the entry's last access, for LRU eviction
+            os.utime(os.path.join(entry, META_FILE))
+        except OSError:
+            return None
+        return pptx_path, pdf_path if os.path.exists(pdf_path) else None
+
+    @staticmethod
+    def _write(path: str, data):
+        """Writes `data` (bytes, or the path of a file to copy) to `path`."""
+        if isinstance(data, (bytes, bytearray)):
+            with open(path, "wb") as f:
+                f.write(data)
+        else:
+            shutil.copyfile(data, path)
+
+    def put(self, key: str, pptx, pdf=None, meta: dict | None = None):
+        """
+        Caches a result. `pptx` and `pdf` are bytes or file paths; `meta`
+        (e.g. the options the key was built from) is kept for invalidate().
+        """
+        tmp_dir = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            self._write(os.path.join(tmp_dir, PPTX_FILE), pptx)
+            if pdf:
+                self._write(os.path.join(tmp_dir, PDF_FILE), pdf)
+            size = sum(entry.stat().st_size for entry in os.scandir(tmp_dir))
+            with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+                json.dump({**(meta or {}), "size": size, "created_at": time.time()}, f, default=str)
+            entry = self._entry(key)
+            if os.path.exists(entry):
+                if not pdf or os.path.exists(os.path.join(entry, PDF_FILE)):
+                    # An identical job finished first; keep its entry
+                    return
+                # Upgrade an entry cached without its PDF
+                shutil.rmtree(entry, ignore_errors=True)
+            try:
+                os.rename(tmp_dir, entry)
+            except OSError:
+                # Another job stored the same key in the meantime
+                return
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._evict()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """(last access, size, path) of every complete entry."""
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(".tmp-") or not entry.is_dir():
+                continue
+            meta_path = os.path.join(entry.path, META_FILE)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    size = json.load(f).get("size", 0)
+                entries.append((os.path.getmtime(meta_path), size, entry.path))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def size(self) -> int:
+        """Total bytes held by the cache."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def invalidate(self, **match) -> int:
+        """
+        Removes every entry whose meta matches all of `match` (e.g.
+        pdf_hash=..., or theme_file=... after a template was edited), or
+        every entry if no criteria are given. Returns how many were removed.
+        """
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(".tmp-") or not entry.is_dir():
+                continue
+            try:
+                with open(os.path.join(entry.path, META_FILE), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = {}
+            if all(meta.get(name) == value for name, value in match.items()):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """Removes every entry."""
+        return self.invalidate()
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache | None:
+    """
+    Returns the process-wide ResultCache (directory from env RESULT_CACHE_DIR,
+    quota from env RESULT_CACHE_MAX_MB, default 1024), or None if the
+    quota is 0 (caching disabled).
+    """
+    global _result_cache
+    max_mb = int(os.getenv("RESULT_CACHE_MAX_MB", "1024"))
+    if max_mb <= 0:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(os.getenv("RESULT_CACHE_DIR", os.path.join(".cache", "results")),
+                                        max_bytes=max_mb << 20)
+        return _result_cache
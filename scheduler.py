@@ -0,0 +1,167 @@
+# scheduler.py
+# Fair sharing of LLM and media-download capacity across concurrent jobs and tenants.
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_TENANT = "default"
+
+# Priority classes, most urgent first
+INTERACTIVE, SMALL, BATCH = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", SMALL: "small", BATCH: "batch"}
+
+
+class _Request:
+    """A call waiting for a slot of one resource."""
+
+    __slots__ = ("tenant", "priority", "start_tag", "seq", "enqueued_at", "granted")
+
+    def __init__(self, tenant: str, priority: int, start_tag: float, seq: int):
+        self.tenant = tenant
+        self.priority = priority
+        self.start_tag = start_tag  # the tenant's virtual start time for this call
+        self.seq = seq
+        self.enqueued_at = time.time()
+        self.granted = threading.Event()
+
+
+class _Resource:
+    """Slots, virtual clock and waiters of one kind of work ("llm", "media")."""
+
+    __slots__ = ("capacity", "in_use", "virtual_time", "finish_tags", "waiting", "granted", "wait_seconds")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self.virtual_time = 0.0
+        self.finish_tags: dict[str, float] = {}  # tenant -> virtual finish time of its last call
+        self.waiting: list[_Request] = []
+        self.granted = 0
+        self.wait_seconds = 0.0
+
+
+class FairScheduler:
+    """
+    Hands out a fixed number of concurrent slots per resource (LLM calls,
+    image downloads) to every job in the process. A job takes one slot per
+    call and gives it back afterwards, so a large job is preempted between
+    its chunks whenever someone more deserving is waiting.
+
+    Waiters are served by priority class first - interactive jobs, then
+    small jobs (at most `small_job_units[resource]` calls), then the rest -
+    and within a class by start-time fair queueing across tenants: each
+    tenant gets capacity in proportion to its weight, however many calls it
+    queues. A call that has waited `max_wait` seconds is promoted to the
+    interactive class, so big jobs are slowed down but never starved.
+    """
+
+    def __init__(self, capacities: dict[str, int] | None = None, tenant_weights: dict[str, float] | None = None,
+                 small_job_units: dict[str, int] | None = None, max_wait: float = 60.0):
+        self.tenant_weights = dict(tenant_weights or {})
+        self.small_job_units = {"llm": 2, "media": 12, **(small_job_units or {})}
+        self.max_wait = max_wait
+        self._resources = {name: _Resource(max(1, capacity))
+                           for name, capacity in (capacities or {"llm": 2, "media": 4}).items()}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def set_weight(self, tenant: str, weight: float):
+        with self._lock:
+            self.tenant_weights[tenant] = weight
+
+    def priority(self, resource: str, units: int | None = None, interactive: bool = False) -> int:
+        """Priority class of a job that needs `units` calls of `resource` in total."""
+        if interactive:
+            return INTERACTIVE
+        if units is not None and units <= self.small_job_units.get(resource, 0):
+            return SMALL
+        return BATCH
+
+    def _rank(self, request: _Request, now: float) -> tuple:
+        priority = INTERACTIVE if now - request.enqueued_at >= self.max_wait else request.priority
+        return priority, request.start_tag, request.seq
+
+    def _dispatch(self, res: _Resource):
+        """Grants free slots to the best waiters. Called with the lock held."""
+        now = time.time()
+        while res.waiting and res.in_use < res.capacity:
+            request = min(res.waiting, key=lambda r: self._rank(r, now))
+            res.waiting.remove(request)
+            res.in_use += 1
+            res.granted += 1
+            res.wait_seconds += now - request.enqueued_at
+            res.virtual_time = max(res.virtual_time, request.start_tag)
+            request.granted.set()
+
+    @contextmanager
+    def slot(self, resource: str, tenant: str = DEFAULT_TENANT, cost: float = 1.0, units: int | None = None,
+             interactive: bool = False):
+        """
+        Blocks until the caller may run one call of `resource` and holds the
+        slot for the `with` block. `cost` is the call's size (e.g. characters
+        sent to the LLM) and `units` the job's total number of such calls.
+        """
+        with self._lock:
+            res = self._resources.get(resource)
+            if res is None:
+                res = self._resources[resource] = _Resource(1)
+            weight = self.tenant_weights.get(tenant, 1.0) or 1.0
+            start_tag = max(res.virtual_time, res.finish_tags.get(tenant, 0.0))
+            res.finish_tags[tenant] = start_tag + cost / weight
+            request = _Request(tenant, self.priority(resource, units, interactive), start_tag, next(self._seq))
+            res.waiting.append(request)
+            self._dispatch(res)
+        request.granted.wait()
+        try:
+            yield
+        finally:
+            with self._lock:
+                res.in_use -= 1
+                self._dispatch(res)
+
+    def snapshot(self) -> dict:
+        """Per resource: capacity, slots in use, waiters by class and tenant, and mean wait."""
+        with self._lock:
+            snapshot = {}
+            for name, res in self._resources.items():
+                waiting = {}
+                for request in res.waiting:
+                    key = f"{request.tenant}/{PRIORITY_NAMES[request.priority]}"
+                    waiting[key] = waiting.get(key, 0) + 1
+                snapshot[name] = {"capacity": res.capacity, "in_use": res.in_use, "waiting": waiting,
+                                  "granted": res.granted,
+                                  "mean_wait_seconds": res.wait_seconds / res.granted if res.granted else 0.0}
+            return snapshot
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    """Parses "math=2,physics=1" into {"math": 2.0, "physics": 1.0}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        tenant, _, weight = item.partition("=")
+        weights[tenant.strip()] = float(weight or 1)
+    return weights
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> FairScheduler:
+    """
+    Returns the process-wide FairScheduler (concurrent LLM calls from env
+    LLM_CONCURRENCY, default 2; concurrent downloads from env
+    MEDIA_CONCURRENCY, default 4; tenant weights from env TENANT_WEIGHTS,
+    e.g. "math=2,physics=1").
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(
+                capacities={"llm": int(os.getenv("LLM_CONCURRENCY", "2")),
+                            "media": int(os.getenv("MEDIA_CONCURRENCY", "4"))},
+                tenant_weights=parse_weights(os.getenv("TENANT_WEIGHTS", "")))
+        return _scheduler
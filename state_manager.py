@@ -1,15 +1,47 @@
 # state_manager.py
 
+import gzip
+import hashlib
 import json
-from typing import Any, Dict
+import os
+import threading
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict
+from workspace import JobWorkspace
+from models import decode_state, to_json
+
+# Snapshot formats: minified JSON, or minified JSON gzipped
+SNAPSHOT_FORMATS = ("json", "json.gz")
 
 class StateManager:
     """
     Manages the shared state (JSON-like dictionary) between all agents.
+    Each instance belongs to one job and owns that job's JobWorkspace.
+
+    The state is copy-on-write and safe to share between threads: `update`
+    swaps in a new top-level dict (values are never mutated in place, so a
+    reader always sees a consistent version), and every key carries a
+    version number. `modify` does read-modify-write under a per-key lock, so
+    stages writing different keys never wait on each other.
+
+    An optional `backend` (e.g. state_store.SQLiteStateStore) makes the state
+    durable: every update is written through to it, with its versions, before
+    `update` returns, and `restore()` reads a
+    job's state back (e.g. in another process or after a crash). It needs
+    `write_state(job_id, changes, versions)` and `read_state(job_id)`, which
+    returns (state, versions) or None. In-memory artifacts are not stored.
     """
 
-    def __init__(self):
+    def __init__(self, workspace: JobWorkspace | None = None, snapshots: str | None = None,
+                 log_limit: int = 1000, backend=None):
+        if snapshots is not None and snapshots not in SNAPSHOT_FORMATS:
+            raise ValueError(f"Unknown snapshot format '{snapshots}'; expected one of {SNAPSHOT_FORMATS}.")
+        self.workspace = workspace or JobWorkspace(auto_cleanup=False)
+        self.backend = backend
         self.state: Dict[str, Any] = {
+            "job_id": self.workspace.job_id,
             "pdf_text": None,
             "chapters": [],
             "slides": [],
@@ -17,35 +49,219 @@ class StateManager:
             "media": [],
             "output_path": None
         }
+        # Guards only the swap of `state` and the version table
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._key_locks: Dict[str, threading.RLock] = {}
+        # Ring buffer: only the most recent `log_limit` entries are kept
+        self._log: deque = deque(maxlen=log_limit)
+        # In-memory outputs (e.g. the built .pptx bytes). Kept out of `state`
+        # so they are never serialized into snapshots.
+        self.artifacts: Dict[str, bytes] = {}
+        # progress.ProgressTracker of the running pipeline, if any; agents report through it
+        self.progress = None
+        # Debug snapshots are opt-in per job (None = off) and written by a
+        # background thread; pending snapshots with the same name coalesce.
+        self.snapshots = snapshots
+        self._snapshot_cond = threading.Condition()
+        self._pending_snapshots: Dict[str, dict] = {}
+        self._snapshot_writer: threading.Thread | None = None
+        self._snapshots_in_flight = 0
+
+    @property
+    def job_id(self) -> str:
+        return self.workspace.job_id
+
+    def _resolve(self, path: str) -> str:
+        """Bare filenames are placed in the job's snapshots directory."""
+        if os.path.isabs(path) or os.path.dirname(path):
+            return path
+        return os.path.join(self.workspace.snapshots_dir, path)
+
+    def _replace(self, changes: Dict[str, Any]):
+        """Swaps in a new state with `changes` applied, bumps versions and writes them through to the backend."""
+        with self._lock:
+            state = dict(self.state)
+            state.update(changes)
+            self.state = state
+            versions = {}
+            for key in changes:
+                self._versions[key] += 1
+                versions[key] = self._versions[key]
+        if self.backend is not None:
+            # Versioned, so concurrent writers of a key cannot leave an older value stored
+            self.backend.write_state(self.job_id, changes, versions)
 
     def update(self, key: str, value: Any):
-        """Update a specific key in the shared state."""
-        self.state[key] = value
+        """Update a specific key in the shared state. `value` must not be mutated afterwards."""
+        self._replace({key: value})
+
+    def modify(self, key: str, fn: Callable[[Any], Any]) -> Any:
+        """
+        Atomically replaces `key` with `fn(current_value)` and returns the new
+        value. `fn` must return a new object rather than mutate its argument.
+        """
+        with self._lock:
+            # Created under the lock, so concurrent first callers share one
+            key_lock = self._key_locks.setdefault(key, threading.RLock())
+        with key_lock:
+            value = fn(self.state.get(key))
+            self.update(key, value)
+            return value
 
     def get(self, key: str):
-        """Retrieve a value by key."""
+        """Retrieve a value by key. Treat it as read-only; write changes back with update()."""
+        if key == "log":
+            return list(self._log)
         return self.state.get(key, None)
 
+    def version(self, key: str) -> int:
+        """How many times `key` has been updated (0 = never)."""
+        return self._versions.get(key, 0)
+
+    def set_artifact(self, name: str, data: bytes):
+        """Store an in-memory output under `name`."""
+        self.artifacts[name] = data
+
+    def get_artifact(self, name: str):
+        """Retrieve an in-memory output by name."""
+        return self.artifacts.get(name, None)
+
+    @staticmethod
+    def _write_json(path: str, state: dict, durable: bool = False):
+        data = json.dumps(state, separators=(",", ":"), default=to_json).encode("utf-8")
+        if path.endswith(".gz"):
+            data = gzip.compress(data, compresslevel=5)
+        # Write to a temp name and rename, so a crash never leaves a truncated file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if durable and hasattr(os, "O_DIRECTORY"):
+            # Persist the rename itself
+            dir_fd = os.open(os.path.dirname(path) or ".", os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def _serializable_state(self) -> dict:
+        state = self.state
+        return {**state, "log": list(self._log)} if self._log else state
+
     def save(self, path: str = "shared_state.json"):
-        """Save current state to a JSON file."""
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.state, f, indent=4)
+        """Save current state to a (minified) JSON file, gzipped if `path` ends in .gz."""
+        self._write_json(self._resolve(path), self._serializable_state())
 
     def load(self, path: str = "shared_state.json"):
-        """Load state from an existing JSON file."""
-        with open(path, "r", encoding="utf-8") as f:
-            self.state = json.load(f)
-            
+        """Load state from an existing JSON file (.gz files are decompressed)."""
+        path = self._resolve(path)
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            state = json.load(f)
+        self._log.clear()
+        self._log.extend(state.pop("log", None) or [])
+        self._replace(decode_state(state))
+
+    def restore(self) -> bool:
+        """Replaces the state with the backend's copy of this job's state. Returns False if it has none."""
+        stored = self.backend.read_state(self.job_id) if self.backend is not None else None
+        if not stored:
+            return False
+        state, versions = stored
+        with self._lock:
+            self.state = {**self.state, **decode_state(state)}
+            self._versions.update(versions)
+        return True
+
+    @staticmethod
+    def hash_inputs(inputs: Any) -> str:
+        """Content hash of a stage's inputs (any JSON-serializable value)."""
+        payload = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=to_json)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _checkpoint_path(self, stage: str) -> str:
+        return os.path.join(self.workspace.checkpoints_dir, f"{stage}.json")
+
+    def write_checkpoint(self, stage: str, input_hash: str, keys):
+        """Durably records the state `keys` a stage produced, tagged with the hash of its inputs."""
+        self._write_json(self._checkpoint_path(stage), {
+            "stage": stage,
+            "input_hash": input_hash,
+            "outputs": {key: self.get(key) for key in keys},
+        }, durable=True)
+
+    def restore_checkpoint(self, stage: str, input_hash: str) -> bool:
+        """
+        Restores a stage's outputs into the state if it has a checkpoint whose
+        inputs hash to `input_hash`. Returns False (and changes nothing) otherwise.
+        """
+        try:
+            with open(self._checkpoint_path(stage), "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if checkpoint.get("input_hash") != input_hash:
+            return False
+        self._replace(decode_state(checkpoint.get("outputs") or {}))
+        return True
+
+    def snapshot(self, name: str):
+        """
+        Queues a write of the current state to `<name>.<format>` in the
+        snapshots directory. Free when snapshots are off for this job. The
+        current state version is captured here (no copy needed, as values are
+        never mutated in place) and serialized on a background thread;
+        if a snapshot of the same name is still pending it is replaced.
+        """
+        if not self.snapshots:
+            return
+        with self._snapshot_cond:
+            self._pending_snapshots[f"{name}.{self.snapshots}"] = self._serializable_state()
+            if self._snapshot_writer is None:
+                self._snapshot_writer = threading.Thread(target=self._write_snapshots, daemon=True)
+                self._snapshot_writer.start()
+            self._snapshot_cond.notify_all()
+
+    def _write_snapshots(self):
+        while True:
+            with self._snapshot_cond:
+                if not self._pending_snapshots:
+                    # Exit when idle; the next snapshot() starts a new writer
+                    self._snapshot_writer = None
+                    self._snapshot_cond.notify_all()
+                    return
+                filename = next(iter(self._pending_snapshots))
+                state = self._pending_snapshots.pop(filename)
+                self._snapshots_in_flight += 1
+            try:
+                self._write_json(self._resolve(filename), state)
+            except Exception as e:
+                print(f"WARNING: Could not write state snapshot '{filename}': {e}")
+            finally:
+                with self._snapshot_cond:
+                    self._snapshots_in_flight -= 1
+                    self._snapshot_cond.notify_all()
+
+    def flush(self, timeout: float | None = None):
+        """Blocks until every queued snapshot has been written."""
+        with self._snapshot_cond:
+            self._snapshot_cond.wait_for(
+                lambda: not self._pending_snapshots and not self._snapshots_in_flight, timeout)
+
     def append_log(self, message: str):
-        self.state.setdefault("log", [])
-        from datetime import datetime
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.state["log"].append(f"[{ts}] {message}")
+        self._log.append(f"[{ts}] {message}")
 
 
 # Quick test
 if __name__ == "__main__":
-    sm = StateManager()
+    sm = StateManager(snapshots="json.gz")
     sm.update("pdf_text", "Sample syllabus text from chapter 1.")
     sm.save()
+    sm.snapshot("shared_state_snapshot")
+    sm.flush()
     print("✅ State saved successfully!")
@@ -0,0 +1,237 @@
+# state_store.py
+# SQLite-backed record of every job's state, so jobs can be queried across runs and processes.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from models import Chapter, Slide, to_json
+from progress import STAGE_END
+
+DEFAULT_DB_PATH = os.path.join("jobs", "state.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id       TEXT PRIMARY KEY,
+    pdf_hash     TEXT,
+    pdf_path     TEXT,
+    theme_file   TEXT,
+    tone         TEXT,
+    slide_count  INTEGER,
+    status       TEXT NOT NULL,
+    error        TEXT,
+    output_path  TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_pdf_hash ON jobs (pdf_hash);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+
+CREATE TABLE IF NOT EXISTS state (
+    job_id     TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    version    INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, key)
+);
+
+CREATE TABLE IF NOT EXISTS chapters (
+    job_id     TEXT NOT NULL,
+    position   INTEGER NOT NULL,
+    chapter_id TEXT,
+    title      TEXT,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS slides (
+    job_id     TEXT NOT NULL,
+    position   INTEGER NOT NULL,
+    slide_id   TEXT,
+    type       TEXT,
+    title      TEXT,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_slides_slide_id ON slides (job_id, slide_id);
+
+CREATE TABLE IF NOT EXISTS assets (
+    job_id     TEXT NOT NULL,
+    slide_id   TEXT NOT NULL,
+    path       TEXT NOT NULL,
+    size       INTEGER,
+    PRIMARY KEY (job_id, slide_id)
+);
+
+CREATE TABLE IF NOT EXISTS stage_timings (
+    job_id     TEXT NOT NULL,
+    stage      TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration   REAL NOT NULL,
+    resumed    INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_stage_timings_job ON stage_timings (job_id);
+"""
+
+
+class SQLiteStateStore:
+    """
+    Persists jobs, their state, chapters, slides, assets and stage timings
+    in one SQLite database in WAL mode, so several jobs (threads or
+    processes) can write concurrently while dashboards read. Each thread
+    gets its own connection. Pass it to a job's StateManager as `backend`:
+    every state update is then written through (chapters and slides also
+    into their own queryable tables) and can be restored from here.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # --- Writes ---
+
+    def create_job(self, job_id: str, pdf_hash: str | None = None, pdf_path: str | None = None,
+                   theme_file: str | None = None, tone: str | None = None, slide_count: int | None = None,
+                   status: str = "running"):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, pdf_hash, pdf_path, theme_file, tone, slide_count, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(job_id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+                (job_id, pdf_hash, pdf_path, theme_file, tone, slide_count, status, now, now))
+
+    def set_status(self, job_id: str, status: str, error: str | None = None, output_path: str | None = None):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, output_path = COALESCE(?, output_path), updated_at = ?"
+                " WHERE job_id = ?", (status, error, output_path, time.time(), job_id))
+
+    @staticmethod
+    def _write_chapters(conn: sqlite3.Connection, job_id: str, chapters: list[Chapter]):
+        conn.execute("DELETE FROM chapters WHERE job_id = ?", (job_id,))
+        conn.executemany(
+            "INSERT INTO chapters (job_id, position, chapter_id, title, data) VALUES (?, ?, ?, ?, ?)",
+            [(job_id, i, c.id, c.title, json.dumps(c.to_dict())) for i, c in enumerate(chapters)])
+
+    @staticmethod
+    def _write_slides(conn: sqlite3.Connection, job_id: str, slides: list[Slide]):
+        assets = []
+        for slide in slides:
+            path = slide.image_path
+            if path and os.path.exists(path):
+                assets.append((job_id, slide.id, path, os.path.getsize(path)))
+        conn.execute("DELETE FROM slides WHERE job_id = ?", (job_id,))
+        conn.executemany(
+            "INSERT INTO slides (job_id, position, slide_id, type, title, data) VALUES (?, ?, ?, ?, ?, ?)",
+            [(job_id, i, s.id, s.type, s.title, json.dumps(s.to_dict()))
+             for i, s in enumerate(slides)])
+        conn.executemany("INSERT OR REPLACE INTO assets (job_id, slide_id, path, size) VALUES (?, ?, ?, ?)", assets)
+
+    def save_chapters(self, job_id: str, chapters: list[Chapter]):
+        with self._connection() as conn:
+            self._write_chapters(conn, job_id, chapters)
+
+    def save_slides(self, job_id: str, slides: list[Slide]):
+        """Replaces the job's slide plan, and records the image files it references as assets."""
+        with self._connection() as conn:
+            self._write_slides(conn, job_id, slides)
+
+    def write_state(self, job_id: str, changes: dict, versions: dict[str, int]):
+        """
+        StateManager backend: stores the changed keys in one transaction.
+        A key is only overwritten by a newer version, and the chapters,
+        slides and output path tables follow whichever version is stored.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            for key, value in changes.items():
+                cursor = conn.execute(
+                    "INSERT INTO state (job_id, key, value, version, updated_at) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(job_id, key) DO UPDATE SET value = excluded.value, version = excluded.version,"
+                    " updated_at = excluded.updated_at WHERE excluded.version > state.version",
+                    (job_id, key, json.dumps(value, separators=(",", ":"), default=to_json),
+                     versions.get(key, 0), now))
+                if not cursor.rowcount:
+                    continue
+                if key == "chapters":
+                    self._write_chapters(conn, job_id, value or [])
+                elif key == "slides":
+                    self._write_slides(conn, job_id, value or [])
+                elif key == "output_path" and value:
+                    conn.execute("UPDATE jobs SET output_path = ?, updated_at = ? WHERE job_id = ?",
+                                 (value, now, job_id))
+
+    def read_state(self, job_id: str) -> tuple[dict, dict[str, int]] | None:
+        """StateManager backend: the job's stored state (as JSON values) and key versions, or None."""
+        rows = self._connection().execute(
+            "SELECT key, value, version FROM state WHERE job_id = ?", (job_id,)).fetchall()
+        if not rows:
+            return None
+        return ({row["key"]: json.loads(row["value"]) for row in rows},
+                {row["key"]: row["version"] for row in rows})
+
+    def record_stage(self, job_id: str, stage: str, started_at: float, duration: float, resumed: bool = False):
+        with self._connection() as conn:
+            conn.execute("INSERT INTO stage_timings (job_id, stage, started_at, duration, resumed) VALUES (?, ?, ?, ?, ?)",
+                         (job_id, stage, started_at, duration, int(resumed)))
+
+    def record_event(self, event):
+        """Progress listener (see progress.ProgressTracker): records each finished stage's timing."""
+        if event.kind == STAGE_END:
+            self.record_stage(event.job_id, event.stage, event.timestamp - event.duration, event.duration,
+                              event.resumed)
+
+    # --- Queries ---
+
+    def get_job(self, job_id: str) -> dict | None:
+        row = self._connection().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def jobs_for_pdf_hash(self, pdf_hash: str, status: str | None = None) -> list[dict]:
+        """All jobs run on the same source PDF, newest first (optionally only with `status`)."""
+        query, params = "SELECT * FROM jobs WHERE pdf_hash = ?", [pdf_hash]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        return [dict(row) for row in self._connection().execute(query + " ORDER BY created_at DESC", params)]
+
+    def jobs_by_status(self, status: str, limit: int = 100) -> list[dict]:
+        return [dict(row) for row in self._connection().execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?", (status, limit))]
+
+    def get_slides(self, job_id: str) -> list[Slide]:
+        return [Slide.from_dict(json.loads(row["data"])) for row in self._connection().execute(
+            "SELECT data FROM slides WHERE job_id = ? ORDER BY position", (job_id,))]
+
+    def get_chapters(self, job_id: str) -> list[Chapter]:
+        return [Chapter.from_dict(json.loads(row["data"])) for row in self._connection().execute(
+            "SELECT data FROM chapters WHERE job_id = ? ORDER BY position", (job_id,))]
+
+    def stage_timings(self, job_id: str) -> list[dict]:
+        return [dict(row) for row in self._connection().execute(
+            "SELECT stage, started_at, duration, resumed FROM stage_timings WHERE job_id = ? ORDER BY started_at",
+            (job_id,))]
+
+    def stage_summary(self) -> list[dict]:
+        """Average and max duration per stage across all jobs (for dashboards)."""
+        return [dict(row) for row in self._connection().execute(
+            "SELECT stage, COUNT(*) AS runs, AVG(duration) AS avg_duration, MAX(duration) AS max_duration"
+            " FROM stage_timings WHERE resumed = 0 GROUP BY stage")]
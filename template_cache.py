@@ -0,0 +1,93 @@
+# template_cache.py
+# Process-level cache of theme templates, so each .pptx is parsed and cleaned once.
+
+import os
+import threading
+from io import BytesIO
+from pptx import Presentation
+from layout_index import LayoutSpec, build_layout_index
+from text_fit import TextFitter, load_font_metrics, theme_font
+
+
+def _remove_all_slides(prs):
+    """Removes every slide, dropping the relationships too so the slide parts are not saved."""
+    sld_id_lst = prs.slides._sldIdLst
+    for sld_id in list(sld_id_lst):
+        prs.part.drop_rel(sld_id.rId)
+        sld_id_lst.remove(sld_id)
+
+
+class _TemplateEntry:
+    def __init__(self, mtime: float | None, blob: bytes, layout_index: dict[str, LayoutSpec],
+                 text_fitter: TextFitter):
+        self.mtime = mtime
+        self.blob = blob
+        self.layout_index = layout_index
+        self.text_fitter = text_fitter
+
+
+class TemplateCache:
+    """
+    Keeps one pre-cleaned (slide-free) serialized copy of each template.
+    `load()` hands out an independent Presentation built from that in-memory
+    blob, skipping the disk read and the starter-slide cleanup. The template's
+    layout index and a TextFitter for its body font are computed at the same
+    time and cached alongside it.
+    Entries are rebuilt when the template file's mtime changes.
+    """
+
+    def __init__(self):
+        self._entries: dict[str | None, _TemplateEntry] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build_entry(template_path: str | None, mtime: float | None) -> _TemplateEntry:
+        prs = Presentation(template_path) if template_path else Presentation()
+        _remove_all_slides(prs)
+        buffer = BytesIO()
+        prs.save(buffer)
+        # Glyph widths are loaded once per font family and shared across templates
+        fitter = TextFitter(load_font_metrics(theme_font(prs)))
+        return _TemplateEntry(mtime, buffer.getvalue(), build_layout_index(prs), fitter)
+
+    def _entry(self, template_path: str | None) -> _TemplateEntry:
+        key = os.path.abspath(template_path) if template_path else None
+        mtime = os.path.getmtime(key) if key else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.mtime != mtime:
+                entry = self._build_entry(key, mtime)
+                self._entries[key] = entry
+            return entry
+
+    def load(self, template_path: str | None = None):
+        """Returns a fresh, slide-free Presentation for `template_path` (None = python-pptx default)."""
+        return Presentation(BytesIO(self._entry(template_path).blob))
+
+    def blob(self, template_path: str | None = None) -> bytes:
+        """Returns the serialized slide-free template, e.g. as the base for zip-level assembly."""
+        return self._entry(template_path).blob
+
+    def layout_index(self, template_path: str | None = None) -> dict[str, LayoutSpec]:
+        """Returns the slide-kind -> LayoutSpec map for `template_path` (see layout_index.py)."""
+        return self._entry(template_path).layout_index
+
+    def text_fitter(self, template_path: str | None = None) -> TextFitter:
+        """Returns the TextFitter for the theme's body font (see text_fit.py)."""
+        return self._entry(template_path).text_fitter
+
+    def invalidate(self, template_path: str | None = None):
+        """Drops one cached template, or every template if no path is given."""
+        with self._lock:
+            if template_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(template_path), None)
+
+
+_template_cache = TemplateCache()
+
+
+def get_template_cache() -> TemplateCache:
+    """Returns the process-wide TemplateCache."""
+    return _template_cache
@@ -0,0 +1,240 @@
+# text_fit.py
+# Local text measurement with font metrics, used to split bullet lists that overflow their placeholder.
+
+import os
+import re
+from functools import lru_cache
+from fontTools.ttLib import TTFont
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from lxml import etree
+
+EMU_PER_POINT = 12700
+# PowerPoint's single line spacing is ~1.2x the font size
+LINE_HEIGHT = 1.2
+# Width (in em) assumed for characters a font has no glyph for, or when no font file is found
+FALLBACK_CHAR_WIDTH = 0.55
+
+FONT_DIRS = [
+    "/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.fonts"),
+    os.path.expanduser("~/.local/share/fonts"), "/Library/Fonts", "/System/Library/Fonts",
+    os.path.expanduser("~/Library/Fonts"), os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+]
+# Metric-compatible stand-ins for common Office fonts, then a wide general fallback
+SUBSTITUTES = {
+    "arial": ["Liberation Sans", "Arimo"],
+    "arial black": ["Archivo Black"],
+    "calibri": ["Carlito"],
+    "cambria": ["Caladea"],
+    "times new roman": ["Liberation Serif", "Tinos"],
+    "courier new": ["Liberation Mono", "Cousine"],
+}
+DEFAULT_FAMILIES = ["DejaVu Sans"]
+
+_NS = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+       "p": "http://schemas.openxmlformats.org/presentationml/2006/main"}
+
+
+def _xpath(element, expr):
+    return etree.XPath(expr, namespaces=_NS)(element)
+
+
+class TextStyle:
+    """Paragraph and frame settings of a body placeholder that affect how much text fits."""
+
+    __slots__ = ("size_pt", "line_spacing", "space_before_pt", "margin_left", "insets", "anchor")
+
+    def __init__(self, size_pt=18.0, line_spacing=1.0, space_before_pt=0.0, margin_left=0,
+                 insets=(91440, 45720, 91440, 45720), anchor="t"):
+        self.size_pt = size_pt
+        self.line_spacing = line_spacing        # multiple of single spacing
+        self.space_before_pt = space_before_pt
+        self.margin_left = margin_left          # EMU
+        self.insets = insets                    # (left, top, right, bottom) in EMU
+        self.anchor = anchor                    # vertical alignment: "t", "ctr" or "b"
+
+
+def _first(elements, xpath, convert, default):
+    """Value of `xpath` in the first element that defines it (nearest style level first)."""
+    for element in elements:
+        values = _xpath(element, xpath)
+        if values:
+            return convert(values[0])
+    return default
+
+
+def placeholder_text_style(ph, master, master_style: str = "bodyStyle") -> TextStyle:
+    """
+    Resolves the level-1 text style of a layout placeholder by walking the
+    inheritance chain: layout placeholder -> master placeholder -> master
+    `master_style` ("bodyStyle", or "titleStyle" for titles).
+    """
+    master_ph = next((m for m in master.placeholders
+                      if m.placeholder_format.type == ph.placeholder_format.type), None)
+    levels = [ph._element]
+    if master_ph is not None:
+        levels.append(master_ph._element)
+    p_prs = [pPr for el in levels for pPr in _xpath(el, "./p:txBody/a:lstStyle/a:lvl1pPr")]
+    p_prs += _xpath(master._element, f"./p:txStyles/p:{master_style}/a:lvl1pPr")
+    body_prs = [bodyPr for el in levels for bodyPr in _xpath(el, "./p:txBody/a:bodyPr")]
+
+    insets = tuple(_first(body_prs, f"@{name}", int, default)
+                   for name, default in (("lIns", 91440), ("tIns", 45720), ("rIns", 91440), ("bIns", 45720)))
+    return TextStyle(
+        size_pt=_first(p_prs, "a:defRPr/@sz", lambda v: int(v) / 100, 18.0),
+        line_spacing=_first(p_prs, "a:lnSpc/a:spcPct/@val", lambda v: int(v) / 100000, 1.0),
+        space_before_pt=_first(p_prs, "a:spcBef/a:spcPts/@val", lambda v: int(v) / 100, 0.0),
+        margin_left=_first(p_prs, "@marL", int, 0),
+        insets=insets,
+        anchor=_first(body_prs, "@anchor", str, "t"),
+    )
+
+
+def theme_element(prs):
+    """The parsed theme XML of the presentation's first slide master, or None."""
+    try:
+        return etree.fromstring(prs.slide_master.part.part_related_by(RT.THEME).blob)
+    except Exception:
+        return None
+
+
+def theme_font(prs, font: str = "minorFont") -> str | None:
+    """The theme's Latin typeface for body text (minorFont, e.g. 'Arial') or headings (majorFont)."""
+    theme = theme_element(prs)
+    if theme is None:
+        return None
+    faces = _xpath(theme, f".//a:fontScheme/a:{font}/a:latin/@typeface")
+    return faces[0] if faces else None
+
+
+@lru_cache(maxsize=1)
+def _font_index() -> dict[str, str]:
+    """Scans the system font directories once: lowercase family name -> regular-style font file."""
+    index = {}
+    for font_dir in FONT_DIRS:
+        if not os.path.isdir(font_dir):
+            continue
+        for root, _, files in os.walk(font_dir):
+            for filename in sorted(files):
+                if not filename.lower().endswith((".ttf", ".otf")):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    font = TTFont(path, lazy=True)
+                    name = font["name"]
+                    family = name.getDebugName(1)
+                    style = (name.getDebugName(2) or "").lower()
+                    font.close()
+                except Exception:
+                    continue
+                if family and (style in ("regular", "book", "normal") or family.lower() not in index):
+                    index[family.lower()] = path
+    return index
+
+
+def find_font_file(family: str) -> str | None:
+    """Path of a regular-style font for `family`, a metric-compatible substitute, or a default font."""
+    index = _font_index()
+    for name in [family] + SUBSTITUTES.get(family.lower(), []) + DEFAULT_FAMILIES:
+        path = index.get(name.lower())
+        if path:
+            return path
+    return None
+
+
+class FontMetrics:
+    """Advance widths (in em) per code point, read once from a font file."""
+
+    def __init__(self, widths: dict[int, float], default_width: float = FALLBACK_CHAR_WIDTH):
+        self.widths = widths
+        self.default_width = default_width
+
+    @classmethod
+    def from_file(cls, path: str) -> "FontMetrics":
+        font = TTFont(path, lazy=True)
+        units_per_em = font["head"].unitsPerEm
+        advances = font["hmtx"].metrics
+        widths = {cp: advances[glyph][0] / units_per_em
+                  for cp, glyph in font.getBestCmap().items() if glyph in advances}
+        font.close()
+        return cls(widths)
+
+    def text_width(self, text: str, size_pt: float) -> int:
+        """Width of `text` set at `size_pt`, in EMU."""
+        widths, default = self.widths, self.default_width
+        return round(sum(widths.get(ord(ch), default) for ch in text) * size_pt * EMU_PER_POINT)
+
+
+@lru_cache(maxsize=None)
+def load_font_metrics(family: str | None) -> FontMetrics:
+    """FontMetrics for `family`, loaded once per process; average widths if no font file is found."""
+    path = find_font_file(family) if family else find_font_file(DEFAULT_FAMILIES[0])
+    if path:
+        try:
+            return FontMetrics.from_file(path)
+        except Exception:
+            pass
+    return FontMetrics({})
+
+
+_WORDS = re.compile(r"\S+")
+
+
+class TextFitter:
+    """
+    Measures bullet lists against a placeholder box with greedy word wrapping,
+    and splits lists that overflow into pages that each fit.
+    """
+
+    def __init__(self, metrics: FontMetrics):
+        self.metrics = metrics
+
+    def line_count(self, text: str, width: int, size_pt: float) -> int:
+        """Number of lines `text` wraps to in a column `width` EMU wide."""
+        space = self.metrics.text_width(" ", size_pt)
+        lines, line_width = 1, 0
+        for word in _WORDS.findall(text):
+            word_width = self.metrics.text_width(word, size_pt)
+            if line_width and line_width + space + word_width > width:
+                lines += 1
+                line_width = 0
+            if line_width:
+                line_width += space + word_width
+            elif word_width > width > 0:
+                # A word wider than the column breaks across lines
+                lines += word_width // width
+                line_width = word_width % width
+            else:
+                line_width = word_width
+        return lines
+
+    def paragraph_height(self, text: str, box, style: TextStyle, first: bool) -> int:
+        """Height of one bullet paragraph in EMU, including its space-before."""
+        left_inset, _, right_inset, _ = style.insets
+        width = box[2] - left_inset - right_inset - style.margin_left
+        line_height = style.size_pt * LINE_HEIGHT * style.line_spacing * EMU_PER_POINT
+        height = self.line_count(text, width, style.size_pt) * line_height
+        if not first:
+            height += style.space_before_pt * EMU_PER_POINT
+        return round(height)
+
+    def split(self, texts: list[str], first_page, other_pages) -> list[list[int]]:
+        """
+        Groups bullet indices into pages. `first_page` and `other_pages` are
+        (box, TextStyle) pairs, so the first page can be narrower (e.g. beside
+        an image). A bullet taller than a whole page still gets a page of its own.
+        """
+        pages, current, used = [], [], 0
+        box, style = first_page
+        for i, text in enumerate(texts):
+            available = box[3] - style.insets[1] - style.insets[3]
+            height = self.paragraph_height(text, box, style, first=not current)
+            if current and used + height > available:
+                pages.append(current)
+                box, style = other_pages
+                current, used = [], 0
+                height = self.paragraph_height(text, box, style, first=True)
+            current.append(i)
+            used += height
+        if current or not pages:
+            pages.append(current)
+        return pages
@@ -0,0 +1,77 @@
+# thumbnails.py
+# Low-resolution slide previews drawn from the slide plan, cached by slide content.
+
+import hashlib
+import json
+import os
+import uuid
+from models import Slide
+from pdf_renderer import render_document
+from cache_utils import evict_lru_files
+
+
+class ThumbnailRenderer:
+    """
+    Renders one small PNG per slide straight from the slide plan (via
+    pdf_renderer), without building the .pptx. Thumbnails are cached on disk
+    under a hash of the slide's content and the bytes of its image and the
+    template, so slides that did not change - in this job or any other - are
+    never redrawn. The least recently used thumbnails are evicted once the
+    cache exceeds `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(".cache", "thumbnails"), width_px: int = 320,
+                 max_bytes: int = 256 << 20):
+        self.cache_dir = cache_dir
+        self.width_px = width_px
+        self.max_bytes = max_bytes
+        # (path, size, mtime) -> content hash, so unchanged files are read once
+        self._digests: dict[tuple, str] = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _file_signature(self, path: str | None) -> str | None:
+        if not (path and os.path.exists(path)):
+            return None
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = self._digests[memo_key] = hashlib.sha1(f.read()).hexdigest()
+        return digest
+
+    def slide_hash(self, slide_data: Slide, template_path: str | None) -> str:
+        """Content hash of everything that affects how the slide looks."""
+        payload = json.dumps({
+            # The image is identified by its bytes, not its per-job path
+            "slide": {k: v for k, v in slide_data.to_dict().items() if k not in ("id", "image_path")},
+            "image": self._file_signature(slide_data.image_path),
+            "template": self._file_signature(template_path),
+            "width": self.width_px,
+        }, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def render(self, slides_plan: list[Slide], template_path: str | None = None) -> list[str]:
+        """Returns a PNG path per slide in `slides_plan`, drawing only the ones not cached yet."""
+        paths = [os.path.join(self.cache_dir, self.slide_hash(s, template_path) + ".png") for s in slides_plan]
+        missing = []
+        for i, path in enumerate(paths):
+            try:
+                # Marks the thumbnail as recently used, for eviction
+                os.utime(path)
+            except OSError:
+                missing.append(i)
+        if not missing:
+            return paths
+
+        doc = render_document([slides_plan[i] for i in missing], template_path)
+        for page, i in zip(doc, missing):
+            pixmap = page.get_pixmap(dpi=max(1, round(self.width_px / page.rect.width * 72)))
+            # Write to a private temp name and rename, so concurrent jobs sharing
+            # the cache never read a half-written file.
+            tmp_path = f"{paths[i]}.{uuid.uuid4().hex}.tmp"
+            pixmap.save(tmp_path, output="png")
+            os.replace(tmp_path, paths[i])
+        doc.close()
+        evict_lru_files(self.cache_dir, self.max_bytes, keep=paths)
+        return paths
@@ -0,0 +1,65 @@
+# workspace.py
+# Job-scoped working directories so concurrent pipeline runs never share file paths.
+
+import os
+import shutil
+import time
+import uuid
+
+WORKSPACES_ROOT = "jobs"
+
+
+class JobWorkspace:
+    """
+    A private directory tree for a single pipeline job:
+
+        jobs/<job_id>/assets      downloaded photos and rendered diagrams
+        jobs/<job_id>/output      the generated .pptx / .pdf
+        jobs/<job_id>/snapshots   StateManager debug snapshots
+        jobs/<job_id>/checkpoints per-stage pipeline checkpoints, for resuming
+        jobs/<job_id>/uploads     the uploaded source PDF
+
+    Used as a context manager, the whole tree is removed on exit unless
+    `auto_cleanup` is False.
+    """
+
+    def __init__(self, job_id: str | None = None, root: str = WORKSPACES_ROOT, auto_cleanup: bool = True):
+        self.job_id = job_id or self.new_job_id()
+        self.root = os.path.join(root, self.job_id)
+        self.auto_cleanup = auto_cleanup
+        self.assets_dir = os.path.join(self.root, "assets")
+        self.output_dir = os.path.join(self.root, "output")
+        self.snapshots_dir = os.path.join(self.root, "snapshots")
+        self.uploads_dir = os.path.join(self.root, "uploads")
+        self.checkpoints_dir = os.path.join(self.root, "checkpoints")
+        for d in (self.assets_dir, self.output_dir, self.snapshots_dir, self.uploads_dir, self.checkpoints_dir):
+            os.makedirs(d, exist_ok=True)
+
+    @staticmethod
+    def new_job_id() -> str:
+        return uuid.uuid4().hex[:12]
+
+    def cleanup(self):
+        """Deletes the workspace and everything in it."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.auto_cleanup:
+            self.cleanup()
+        return False
+
+
+def cleanup_stale_workspaces(root: str = WORKSPACES_ROOT, max_age_seconds: int = 24 * 3600) -> int:
+    """Removes workspaces left behind by crashed or abandoned jobs. Returns how many were removed."""
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed